@@ -0,0 +1,46 @@
+"""Wall time and peak RSS of reading each table of a feed with Feed._read_csv
+
+Usage: python benchmarks/read_csv.py [path] [repeat]
+
+Each table is read in a fresh process so that peak RSS is measured per table.
+"""
+from multiprocessing import get_context
+import os
+import resource
+import sys
+import time
+
+from partridge.config import empty_config
+from partridge.gtfs import Feed
+
+
+DEFAULT_PATH = os.path.join(
+    os.path.dirname(__file__), "..", "tests", "fixtures", "seattle-area-2017-11-16"
+)
+
+
+def measure(path: str, filename: str, repeat: int):
+    feed = Feed(path, config=empty_config())
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        feed._read_csv(filename)
+        best = min(best, time.perf_counter() - start)
+    # ru_maxrss is in kilobytes on Linux
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return best, peak_rss
+
+
+def main(path: str = DEFAULT_PATH, repeat: int = 5) -> None:
+    filenames = sorted(Feed(path, config=empty_config())._pathmap)
+    ctx = get_context("spawn")
+
+    print("{:<24} {:>10} {:>14}".format("file", "best (ms)", "peak RSS (MB)"))
+    for filename in filenames:
+        with ctx.Pool(1) as pool:
+            best, peak_rss = pool.apply(measure, (path, filename, repeat))
+        print("{:<24} {:>10.1f} {:>14.1f}".format(filename, best * 1000, peak_rss))
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2], *map(int, sys.argv[2:3]))
@@ -1,4 +1,6 @@
 from .__version__ import __version__
+from .batch import map_feeds
+from .merge import merge_feeds
 from .readers import (
     load_feed,
     load_geo_feed,
@@ -8,19 +10,22 @@ from .readers import (
     read_service_ids_by_date,
     read_dates_by_service_ids,
     read_trip_counts_by_date,
+    read_trip_counts_by_date_and_route,
 )
 from .writers import extract_feed
 
-
 __all__ = [
     "__version__",
     "extract_feed",
     "load_feed",
     "load_geo_feed",
     "load_raw_feed",
+    "map_feeds",
+    "merge_feeds",
     "read_busiest_date",
     "read_busiest_week",
     "read_service_ids_by_date",
     "read_dates_by_service_ids",
     "read_trip_counts_by_date",
+    "read_trip_counts_by_date_and_route",
 ]
@@ -0,0 +1,114 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+import os
+import sys
+from typing import Any, Callable, Dict, Iterable, Iterator, NamedTuple, Optional
+
+import networkx as nx
+
+from .readers import read_busiest_date
+from .types import View
+from .writers import extract_feed
+
+
+class FeedResult(NamedTuple):
+    path: str
+    value: Any
+    error: Optional[BaseException]
+
+
+def _process_pool(
+    workers: int, max_tasks_per_child: Optional[int]
+) -> ProcessPoolExecutor:
+    if max_tasks_per_child is None:
+        return ProcessPoolExecutor(workers)
+    if sys.version_info < (3, 11):
+        raise ValueError("max_tasks_per_child requires Python 3.11 or newer")
+    return ProcessPoolExecutor(workers, max_tasks_per_child=max_tasks_per_child)
+
+
+def map_feeds(
+    func: Callable[[str], Any],
+    paths: Iterable[str],
+    max_workers: Optional[int] = None,
+    max_tasks_per_child: Optional[int] = None,
+) -> Iterator[FeedResult]:
+    """Call `func(path)` for each feed in a pool of processes
+
+    Results are yielded as each feed finishes, not in the order of `paths`.
+    At most `max_workers` feeds (by default, one per CPU) are processed at a
+    time, and the next feed is only submitted once a result has been
+    collected, so the memory used is bounded by the number of workers rather
+    than the number of feeds. `func` must be picklable, e.g. a module-level
+    function or a `functools.partial` of one.
+
+    An exception raised for a feed is returned as the result's `error`
+    instead of stopping the batch. If a worker process dies, e.g. when it
+    is killed for running out of memory, the feeds in progress fail with
+    `BrokenProcessPool` and the remaining feeds run in a new pool.
+
+    If `max_tasks_per_child` is given, worker processes are replaced after
+    processing that many feeds, returning their memory to the operating
+    system. This requires Python 3.11 or newer.
+    """
+    workers = max_workers or os.cpu_count() or 1
+    pending = iter(paths)
+    running: Dict[Future, str] = {}
+    executor = _process_pool(workers, max_tasks_per_child)
+    try:
+        while True:
+            while len(running) < workers:
+                path = next(pending, None)
+                if path is None:
+                    break
+                running[executor.submit(func, path)] = path
+
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            if any(isinstance(f.exception(), BrokenProcessPool) for f in done):
+                # Every feed in progress fails along with the pool
+                done = set(running)
+                executor.shutdown()
+                executor = _process_pool(workers, max_tasks_per_child)
+
+            for future in done:
+                path = running.pop(future)
+                error = future.exception()
+                value = None if error is not None else future.result()
+                yield FeedResult(path, value, error)
+    finally:
+        for future in running:
+            future.cancel()
+        executor.shutdown()
+
+
+def read_busiest_dates(
+    paths: Iterable[str], max_workers: Optional[int] = None
+) -> Iterator[FeedResult]:
+    """Read the busiest date of each feed in a pool of processes"""
+    return map_feeds(read_busiest_date, paths, max_workers=max_workers)
+
+
+def extract_feeds(
+    paths: Iterable[str],
+    outdir: str,
+    view: View,
+    config: Optional[nx.DiGraph] = None,
+    max_workers: Optional[int] = None,
+) -> Iterator[FeedResult]:
+    """Extract a subset of each feed into a zip file of the same name in
+    `outdir`, in a pool of processes
+    """
+    func = partial(_extract_feed, outdir=outdir, view=view, config=config)
+    return map_feeds(func, paths, max_workers=max_workers)
+
+
+def _extract_feed(
+    inpath: str, outdir: str, view: View, config: Optional[nx.DiGraph]
+) -> str:
+    name, _ = os.path.splitext(os.path.basename(os.path.normpath(inpath)))
+    outpath = os.path.join(outdir, name + ".zip")
+    return extract_feed(inpath, outpath, view, config)
@@ -0,0 +1,174 @@
+import functools
+import glob
+import hashlib
+import os
+import shutil
+import tempfile
+from typing import Any, Optional
+
+import networkx as nx
+import pandas as pd
+
+try:
+    import pyarrow.feather as feather
+except ImportError as impexc:
+    print(impexc)
+    print("You must install pyarrow to use this module.")
+    raise
+
+from .__version__ import __version__
+from .spatial import SpatialFilter
+from .types import View
+from .utilities import setwrap
+
+
+DEFAULT_MAX_BYTES = 10 * 2 ** 30
+EXTENSION = ".arrow"
+
+
+class FeedCache(object):
+    """An on-disk cache of parsed tables for a single feed
+
+    Tables are stored as uncompressed Arrow IPC (Feather) files under
+    `directory/<feed hash>/<config fingerprint>/` and memory-mapped when read
+    back. Once the directory holds more than `max_bytes` of tables, the least
+    recently used tables (across all feeds in the directory) are deleted.
+    """
+
+    def __init__(self, directory: str, key: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.key = key
+        self.max_bytes = max_bytes
+
+    def get(self, filename: str) -> Optional[pd.DataFrame]:
+        path = self._path(filename)
+        try:
+            df = feather.read_feather(path, memory_map=True)
+            # Record the access for LRU eviction
+            os.utime(path)
+        except OSError:
+            # Missing, or evicted by another process
+            return None
+        return df
+
+    def set(self, filename: str, df: pd.DataFrame) -> None:
+        path = self._path(filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temporary file first so readers never see partial tables
+        fd, tmppath = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                feather.write_feather(df, f, compression="uncompressed")
+            os.replace(tmppath, path)
+        except BaseException:
+            os.remove(tmppath)
+            raise
+
+        evict(self.directory, self.max_bytes)
+
+    def invalidate(self) -> None:
+        """Delete all cached tables for this feed and configuration"""
+        shutil.rmtree(os.path.join(self.directory, self.key), ignore_errors=True)
+
+    def _path(self, filename: str) -> str:
+        return os.path.join(self.directory, self.key, filename + EXTENSION)
+
+
+def cache_key(path: str, view: View, config: nx.DiGraph) -> str:
+    """Return a cache key for the feed contents, view and config"""
+    return os.path.join(feed_hash(path), fingerprint(view, config))
+
+
+def feed_hash(path: str) -> str:
+    """Return a hash of the contents of a feed zip or directory"""
+    h = hashlib.sha256()
+    if os.path.isdir(path):
+        paths = sorted(
+            os.path.join(root, fname)
+            for root, _subdirs, files in os.walk(path)
+            for fname in files
+        )
+    else:
+        paths = [path]
+
+    for p in paths:
+        h.update(os.path.relpath(p, path).encode("utf-8"))
+        with open(p, "rb") as f:
+            for chunk in iter(lambda: f.read(2 ** 20), b""):
+                h.update(chunk)
+
+    return h.hexdigest()
+
+
+def fingerprint(view: View, config: nx.DiGraph) -> str:
+    """Return a hash of the view and config
+
+    Tables are cached before node transformations are applied, so they do
+    not contribute to the fingerprint. Callables are identified by name, so
+    edit a function's name (or invalidate the cache) when changing it.
+    """
+    nodes = [
+        (node, {k: v for k, v in data.items() if k != "transformations"})
+        for node, data in config.nodes(data=True)
+    ]
+    views = {
+        filename: {
+            col: (
+                repr(values)
+                if isinstance(values, SpatialFilter)
+                else sorted(setwrap(values))
+            )
+            for col, values in filters.items()
+        }
+        for filename, filters in view.items()
+    }
+    description = _describe([__version__, nodes, list(config.edges(data=True)), views])
+    return hashlib.sha256(description.encode("utf-8")).hexdigest()
+
+
+def clear_cache(directory: str, path: Optional[str] = None) -> None:
+    """Delete cached tables for the feed at `path`, or for all feeds"""
+    if path is None:
+        shutil.rmtree(directory, ignore_errors=True)
+    else:
+        shutil.rmtree(os.path.join(directory, feed_hash(path)), ignore_errors=True)
+
+
+def evict(directory: str, max_bytes: int) -> None:
+    """Delete least recently used tables until the cache fits in `max_bytes`"""
+    entries = []
+    for path in glob.glob(os.path.join(directory, "*", "*", "*" + EXTENSION)):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def _describe(obj: Any) -> str:
+    """A stable description of (nested) config values"""
+    if isinstance(obj, functools.partial):
+        return "partial({}, {}, {})".format(
+            _describe(obj.func), _describe(obj.args), _describe(obj.keywords)
+        )
+    if isinstance(obj, dict):
+        items = sorted((_describe(k), _describe(v)) for k, v in obj.items())
+        return "{" + ", ".join("{}: {}".format(k, v) for k, v in items) + "}"
+    if isinstance(obj, (set, frozenset)):
+        return "{" + ", ".join(sorted(map(_describe, obj))) + "}"
+    if isinstance(obj, (list, tuple)):
+        return "[" + ", ".join(map(_describe, obj)) + "]"
+    if callable(obj) and hasattr(obj, "__qualname__"):
+        return "{}.{}".format(getattr(obj, "__module__", None), obj.__qualname__)
+    return repr(obj)
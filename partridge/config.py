@@ -1,5 +1,9 @@
 # flake8: noqa E501
 
+from collections import Counter
+from functools import partial
+from typing import Dict, Optional, Tuple
+
 import networkx as nx
 import pandas as pd
 
@@ -17,9 +21,11 @@ def default_config() -> nx.DiGraph:
     return G
 
 
-def geo_config() -> nx.DiGraph:
+def geo_config(
+    simplify: Optional[float] = None, decimals: Optional[int] = None
+) -> nx.DiGraph:
     G = default_config()
-    add_geo_config(G)
+    add_geo_config(G, simplify=simplify, decimals=decimals)
     return G
 
 
@@ -322,9 +328,20 @@ def add_node_config(g: nx.DiGraph) -> nx.DiGraph:
     )
 
 
-def add_geo_config(g: nx.DiGraph) -> nx.DiGraph:
+def add_geo_config(
+    g: nx.DiGraph, simplify: Optional[float] = None, decimals: Optional[int] = None
+) -> nx.DiGraph:
+    """Build geometries for shapes and stops
+
+    Shapes are simplified to a tolerance of `simplify` meters and their
+    coordinates rounded to `decimals` decimal places, if given. See
+    `partridge.geo.build_shapes`.
+    """
     from .geo import build_shapes, build_stops
 
+    if simplify is not None or decimals is not None:
+        build_shapes = partial(build_shapes, simplify=simplify, decimals=decimals)
+
     for node, transform in (("shapes.txt", build_shapes), ("stops.txt", build_stops)):
         assert node in g.nodes, "Missing config for node: {}".format(node)
 
@@ -336,6 +353,31 @@ def add_geo_config(g: nx.DiGraph) -> nx.DiGraph:
     return g
 
 
+def id_domains(G: nx.DiGraph) -> Dict[Tuple[str, str], str]:
+    """Group the (file, column) pairs joined by dependency edges into domains
+    of identifiers, e.g. `stop_times.txt`'s `stop_id` and `transfers.txt`'s
+    `from_stop_id` are both stop identifiers.
+
+    Each domain is named after its most referenced column.
+    """
+    pairs = nx.Graph()
+    references: Counter = Counter()
+    for _, _, data in G.edges(data=True):
+        for deps in data.get("dependencies", []):
+            a, b = deps.items()
+            pairs.add_edge(a, b)
+            references.update([a[1], b[1]])
+
+    domains = {}
+    for component in nx.connected_components(pairs):
+        columns = sorted({col for _, col in component})
+        name = max(columns, key=references.__getitem__)
+        for pair in component:
+            domains[pair] = name
+
+    return domains
+
+
 def reroot_graph(G: nx.DiGraph, node: str) -> nx.DiGraph:
     """Return a copy of the graph rooted at the given node"""
     G = G.copy()
@@ -1,39 +1,116 @@
-from typing import Dict, List
+from typing import Optional
 
+import numpy as np
 import pandas as pd
 
+from .spatial import EARTH_RADIUS, ShapeArrays, shape_arrays
+
 try:
     import geopandas as gpd
-    from shapely.geometry import LineString, Point
+    import shapely
 except ImportError as impexc:
     print(impexc)
     print("You must install GeoPandas to use this module.")
     raise
 
 
-DEFAULT_CRS = {"init": "EPSG:4326"}
+DEFAULT_CRS = "EPSG:4326"
+
 
+def build_shapes(
+    df: pd.DataFrame, simplify: Optional[float] = None, decimals: Optional[int] = None
+) -> gpd.GeoDataFrame:
+    """Build a LineString for each shape
 
-def build_shapes(df: pd.DataFrame) -> gpd.GeoDataFrame:
+    If `simplify` is given, shapes are simplified with the Douglas-Peucker
+    algorithm, dropping points that are closer than `simplify` meters to the
+    simplified line. If `decimals` is given, coordinates are rounded to that
+    many decimal places and repeated points are dropped.
+
+    When either is given, the number of points before and after is reported
+    in `attrs["point_count"]` of the returned GeoDataFrame.
+    """
     if df.empty:
         return gpd.GeoDataFrame({"shape_id": [], "geometry": []}, crs=DEFAULT_CRS)
 
-    data: Dict[str, List] = {"shape_id": [], "geometry": []}
-    for shape_id, shape in df.sort_values("shape_pt_sequence").groupby("shape_id"):
-        data["shape_id"].append(shape_id)
-        data["geometry"].append(
-            LineString(list(zip(shape.shape_pt_lon, shape.shape_pt_lat)))
-        )
+    shapes = shape_arrays(df)
+    original = len(shapes.coords)
+    if simplify is not None:
+        shapes = _simplify(shapes, simplify)
+    if decimals is not None:
+        shapes = _quantize(shapes, decimals)
+
+    shape_ids, offsets, coords = shapes
+    indices = np.repeat(np.arange(len(shape_ids)), np.diff(offsets))
+    geometry = shapely.linestrings(coords, indices=indices)
 
-    return gpd.GeoDataFrame(data, crs=DEFAULT_CRS)
+    gdf = gpd.GeoDataFrame(
+        {"shape_id": shape_ids, "geometry": geometry}, crs=DEFAULT_CRS
+    )
+    if simplify is not None or decimals is not None:
+        gdf.attrs["point_count"] = {"original": original, "simplified": len(coords)}
+
+    return gdf
 
 
 def build_stops(df: pd.DataFrame) -> gpd.GeoDataFrame:
     if df.empty:
         return gpd.GeoDataFrame(df, geometry=[], crs=DEFAULT_CRS)
 
-    df["geometry"] = df.apply(lambda s: Point(s.stop_lon, s.stop_lat), axis=1)
+    geometry = shapely.points(
+        df.stop_lon.to_numpy(dtype=np.float64), df.stop_lat.to_numpy(dtype=np.float64)
+    )
+
+    # Share the other columns with the input rather than copying them
+    columns = {
+        col: df[col] for col in df.columns if col not in ("stop_lon", "stop_lat")
+    }
+    columns["geometry"] = geometry
+
+    return gpd.GeoDataFrame(columns, crs=DEFAULT_CRS, copy=False)
+
+
+def _simplify(shapes: ShapeArrays, tolerance: float) -> ShapeArrays:
+    """Simplify shapes in an equirectangular projection around each shape's
+    mean latitude, where distances are roughly in meters
+    """
+    shape_ids, offsets, coords = shapes
+    counts = np.diff(offsets)
+    indices = np.repeat(np.arange(len(shape_ids)), counts)
+
+    latitude = np.add.reduceat(coords[:, 1], offsets[:-1]) / counts
+    scale = (
+        np.radians(1)
+        * EARTH_RADIUS
+        * np.column_stack([np.cos(np.radians(latitude)), np.ones(len(latitude))])
+    )
+
+    lines = shapely.linestrings(coords * scale[indices], indices=indices)
+    lines = shapely.simplify(lines, tolerance, preserve_topology=False)
+
+    counts = shapely.get_num_coordinates(lines)
+    offsets = np.zeros(len(shape_ids) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    coords = shapely.get_coordinates(lines) / np.repeat(scale, counts, axis=0)
+
+    return ShapeArrays(shape_ids, offsets, coords)
+
+
+def _quantize(shapes: ShapeArrays, decimals: int) -> ShapeArrays:
+    """Round coordinates, dropping points equal to the previous point of
+    their shape. The last point of each shape is kept so that every shape
+    has at least two points.
+    """
+    shape_ids, offsets, coords = shapes
+    coords = np.round(coords, decimals)
+
+    keep = np.ones(len(coords), dtype=bool)
+    keep[1:] = (coords[1:] != coords[:-1]).any(axis=1)
+    keep[offsets[:-1]] = True
+    keep[offsets[1:] - 1] = True
 
-    df.drop(["stop_lon", "stop_lat"], axis=1, inplace=True)
+    counts = np.add.reduceat(keep, offsets[:-1])
+    offsets = np.zeros(len(shape_ids) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
 
-    return gpd.GeoDataFrame(df, crs={"init": "EPSG:4326"})
+    return ShapeArrays(shape_ids, offsets, coords[keep])
@@ -1,13 +1,55 @@
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+import io
+from itertools import chain
 import os
-from threading import RLock
-from typing import Dict, Optional, Union
+import sys
+from threading import Lock, RLock
+from typing import (
+    TYPE_CHECKING,
+    BinaryIO,
+    Callable,
+    DefaultDict,
+    Dict,
+    Generator,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+    cast,
+)
+import zipfile
 
 import networkx as nx
+import numpy as np
 import pandas as pd
 
-from .config import default_config
+from .config import default_config, id_domains
+from .spatial import (
+    SpatialFilter,
+    StopIndex,
+    filter_columns,
+    select_within,
+    stop_index,
+)
 from .types import View
-from .utilities import detect_encoding, empty_df, setwrap
+from .utilities import (
+    WhitespaceScanner,
+    detect_encoding,
+    empty_df,
+    estimate_memory_usage,
+    setwrap,
+)
+
+if TYPE_CHECKING:
+    from .cache import FeedCache
+
+
+DEFAULT_CHUNKSIZE = 200000
+DEFAULT_STREAM_THRESHOLD = 256 * 2 ** 20
 
 
 def _read_file(filename: str) -> property:
@@ -20,43 +62,293 @@ def _read_file(filename: str) -> property:
 class Feed(object):
     def __init__(
         self,
-        source: Union[str, "Feed"],
+        source: Union[str, "Feed", Callable[[str], pd.DataFrame]],
         view: Optional[View] = None,
         config: Optional[nx.DiGraph] = None,
+        cache: Optional["FeedCache"] = None,
+        categorical_ids: bool = False,
+        layers: Optional[List[Tuple[nx.DiGraph, View]]] = None,
+        chunksize: Optional[int] = None,
+        stream_threshold: Optional[int] = None,
+        memory_budget: Optional[int] = None,
     ):
         self._config: nx.DiGraph = default_config() if config is None else config
         self._view: View = {} if view is None else view
+        # Each file is filtered and pruned by these (config, view) layers in
+        # order, ending with the feed's own config and view. Layers only
+        # select rows of the raw file, which is read once.
+        self._layers: List[Tuple[nx.DiGraph, View]] = list(layers or [])
+        self._layers.append((self._config, self._view))
+        self._raw: Dict[str, pd.DataFrame] = {}
+        self._rows: Dict[Tuple[int, str], Optional[np.ndarray]] = {}
+        self._changed: Dict[Tuple[int, str], bool] = {}
+        self._codes: Dict[Tuple[str, str], Optional[Tuple[np.ndarray, pd.Index]]] = {}
+        self._keys: Dict[Tuple[int, str, str], Optional[pd.Index]] = {}
+        self._stats: List[Tuple[int, str, str, int, int]] = []
+        self._plan_locks: Dict[Tuple[int, str], RLock] = {}
+        self._plan_lock = Lock()
+        self._streaming: Dict[str, bool] = {}
+        # Files of at least `stream_threshold` bytes are read in chunks of
+        # `chunksize` rows, keeping only the rows selected by the view
+        self._chunksize = DEFAULT_CHUNKSIZE if chunksize is None else chunksize
+        self._stream_threshold = (
+            DEFAULT_STREAM_THRESHOLD if stream_threshold is None else stream_threshold
+        )
+        # Sizes of the cached tables, in order of use. Once the tables take
+        # up more than `memory_budget` bytes, the least recently used are
+        # evicted and read again on their next use.
         self._cache: Dict[str, pd.DataFrame] = {}
+        self._sizes: Dict[str, int] = {}
+        # Tables replaced with `set`, which are never evicted to stay within
+        # the memory budget
+        self._pinned: Set[str] = set()
+        self._memory_budget = memory_budget
+        self._cache_lock = RLock()
+        # Built from the cached stops table, and dropped along with it
+        self._stop_index: Optional[StopIndex] = None
+        self._disk_cache: Optional["FeedCache"] = cache
         self._pathmap: Dict[str, str] = {}
-        self._delete_after_reading: bool = False
+        self._zippath: Optional[str] = None
         self._shared_lock = RLock()
         self._locks: Dict[str, RLock] = {}
+        self._domains = id_domains(self._config) if categorical_ids else {}
+        self._categories: Dict[str, pd.Index] = {}
+        self._categories_lock = RLock()
+        self._read: Callable[[str], pd.DataFrame]
         if isinstance(source, self.__class__):
             self._read = source.get
+        elif callable(source):
+            # A function returning the raw table of a file by name
+            self._read = source
         elif isinstance(source, str) and os.path.isdir(source):
             self._read = self._read_csv
             self._bootstrap(source)
+        elif isinstance(source, str) and zipfile.is_zipfile(source):
+            self._read = self._read_csv
+            self._bootstrap_zip(source)
         else:
             raise ValueError("Invalid source")
 
     def get(self, filename: str) -> pd.DataFrame:
         lock = self._locks.get(filename, self._shared_lock)
         with lock:
-            df = self._cache.get(filename)
+            df = self._cached(filename)
             if df is None:
-                df = self._read(filename)
-                df = self._filter(filename, df)
-                df = self._prune(filename, df)
-                self._convert_types(filename, df)
-                df = df.reset_index(drop=True)
+                df = self._read_cached(filename)
+                self._categorize(filename, df)
                 df = self._transform(filename, df)
-                self.set(filename, df)
-            return self._cache[filename]
+                self._store(filename, df, pinned=False)
+            return df
+
+    def load_all(
+        self,
+        filenames: Optional[Iterable[str]] = None,
+        max_workers: Optional[int] = None,
+    ) -> None:
+        """Read files up front in a thread pool
+
+        Each file is scheduled once its dependencies in the config graph have
+        been read. Independent files are read at the same time, which only
+        overlaps the latency of reading them from slow storage: parsing
+        holds the GIL, so reads bound by the CPU are no faster than reading
+        the files one by one. Defaults to every file in the config.
+        """
+        if filenames is None:
+            nodes = set(self._config.nodes)
+        else:
+            nodes = set()
+            for filename in filenames:
+                nodes.add(filename)
+                if filename in self._config:
+                    nodes |= nx.descendants(self._config, filename)
+
+        _run_in_dependency_order(self._config, nodes, self.get, max_workers)
+
+    def iter_chunks(
+        self,
+        filename: str,
+        columns: Optional[Iterable[str]] = None,
+        chunksize: Optional[int] = None,
+    ) -> Iterator[pd.DataFrame]:
+        """Iterate over the rows of a file in chunks
+
+        Chunks are filtered, pruned and converted like `Feed.get`, except
+        that node transformations are not applied, and the file is not
+        cached. When the view can be resolved one chunk at a time, the file
+        is streamed, so that memory use is bounded by the chunk size.
+        Otherwise, the rows to keep are resolved first and then converted
+        one chunk at a time.
+
+        If the file has already been read, chunks are taken from the cached
+        table. Pass `columns` to only read (and yield) some of the columns.
+        """
+        chunksize = self._chunksize if chunksize is None else chunksize
+        columns = None if columns is None else list(columns)
+        last = len(self._layers) - 1
+
+        cached = self._cached(filename)
+        if cached is not None:
+            chunks = self._slices(cached, None, chunksize)
+        elif (
+            self._read == self._read_csv
+            and filename in self._pathmap
+            and self._filesize(filename) > 0
+            and self._pushdown_depth(filename) == last
+        ):
+            chunks = self._iter_filtered(filename, columns, chunksize)
+        else:
+            rows = self._select(last, filename)
+            chunks = self._slices(self._read_raw(filename), rows, chunksize)
+
+        start = 0
+        try:
+            for chunk in chunks:
+                if chunk.empty:
+                    continue
+                if columns is not None:
+                    chunk = chunk.reindex(
+                        columns=[col for col in columns if col in chunk.columns]
+                    )
+                if cached is None:
+                    self._convert_types(filename, chunk)
+                    self._categorize(filename, chunk)
+                chunk.index = pd.RangeIndex(start, start + len(chunk))
+                start += len(chunk)
+                yield chunk
+        finally:
+            if cached is None:
+                self._release(filename)
+
+    def prune_stats(self) -> pd.DataFrame:
+        """Count the rows removed by each dependency edge
+
+        Each row describes pruning a file by one of its dependencies in a
+        layer of the view: `rows` were considered, after view filters and
+        earlier edges, and `removed` of them had no match. Layers that leave
+        a file unchanged are skipped and not reported.
+        """
+        columns = ["layer", "filename", "dependency", "rows", "removed"]
+        stats = pd.DataFrame(self._stats, columns=columns)
+        # Files read in chunks are pruned one chunk at a time
+        return stats.groupby(columns[:3], sort=False, as_index=False).sum()
+
+    def stop_index(self) -> StopIndex:
+        """Return a spatial index of the stops, for nearest stop and radius
+        queries. The index is built on first use and kept until the stops
+        table is evicted.
+        """
+        lock = self._locks.get("stops.txt", self._shared_lock)
+        with lock:
+            stops = self.get("stops.txt")
+            if self._stop_index is None:
+                self._stop_index = stop_index(stops)
+            return self._stop_index
 
     def set(self, filename: str, df: pd.DataFrame) -> None:
+        """Replace a table. Tables set this way can't be read again, so they
+        are pinned in memory: they count towards the memory budget but are
+        never evicted to stay within it, nor dropped by `clear`. Only an
+        explicit `evict` drops them, discarding the changes.
+        """
+        self._store(filename, df, pinned=True)
+
+    def evict(self, filename: str) -> None:
+        """Drop a table from memory. It is read again on its next use.
+        Tables replaced with `set` are dropped too, losing their changes.
+        """
+        with self._cache_lock:
+            self._cache.pop(filename, None)
+            self._sizes.pop(filename, None)
+            self._pinned.discard(filename)
+            if filename == "stops.txt":
+                self._stop_index = None
+
+    def clear(self) -> None:
+        """Drop every table from memory, other than those replaced with
+        `set`, along with any raw files held to resolve the view. Tables are
+        read again on their next use.
+        """
+        with self._cache_lock:
+            for filename in list(self._cache):
+                if filename not in self._pinned:
+                    self.evict(filename)
+
+        for filename in list(self._raw):
+            self._release(filename)
+
+    def memory_usage(self) -> pd.Series:
+        """Return the approximate number of bytes used by each table held in
+        memory, from least to most recently used
+        """
+        with self._cache_lock:
+            return pd.Series(self._sizes, dtype="int64")
+
+    def _store(self, filename: str, df: pd.DataFrame, pinned: bool) -> None:
+        """Hold a table in memory, pinned if it can't be read again"""
         lock = self._locks.get(filename, self._shared_lock)
         with lock:
-            self._cache[filename] = df
+            if isinstance(df, pd.DataFrame):
+                size = estimate_memory_usage(df)
+            else:
+                size = sys.getsizeof(df)
+
+            with self._cache_lock:
+                self._cache[filename] = df
+                if pinned:
+                    self._pinned.add(filename)
+                else:
+                    self._pinned.discard(filename)
+                if filename == "stops.txt":
+                    self._stop_index = None
+                self._sizes.pop(filename, None)
+                self._sizes[filename] = size
+                self._evict_over_budget(filename)
+
+    def _cached(self, filename: str) -> Optional[pd.DataFrame]:
+        """Return a table held in memory, marking it as recently used"""
+        with self._cache_lock:
+            df = self._cache.get(filename)
+            if df is not None:
+                self._sizes[filename] = self._sizes.pop(filename)
+            return df
+
+    def _evict_over_budget(self, keep: str) -> None:
+        """Evict the least recently used tables, other than `keep`, until the
+        tables fit within the memory budget
+        """
+        if self._memory_budget is None:
+            return
+
+        with self._cache_lock:
+            total = sum(self._sizes.values())
+            for filename in list(self._sizes):
+                if total <= self._memory_budget:
+                    break
+                if filename != keep and filename not in self._pinned:
+                    total -= self._sizes[filename]
+                    self.evict(filename)
+
+    def _read_cached(self, filename: str) -> pd.DataFrame:
+        """Read, filter, prune and convert a file, using the disk cache if present"""
+        if self._disk_cache is not None:
+            df = self._disk_cache.get(filename)
+            if df is not None:
+                return df
+
+        rows = self._select(len(self._layers) - 1, filename)
+        df = self._read_raw(filename)
+        # Every layer has been resolved, so the raw file is no longer needed
+        self._release(filename)
+
+        if rows is not None:
+            df = df.take(rows)
+        self._convert_types(filename, df)
+        df = df.reset_index(drop=True)
+
+        if self._disk_cache is not None:
+            self._disk_cache.set(filename, df)
+
+        return df
 
     agency = _read_file("agency.txt")
     calendar = _read_file("calendar.txt")
@@ -85,70 +377,634 @@ class Feed(object):
                 # Build a lock for each file to synchronize reads.
                 self._locks[basename] = RLock()
 
+    def _bootstrap_zip(self, path: str) -> None:
+        self._zippath = path
+        # Index archive members, including those in nested folders
+        with zipfile.ZipFile(path) as zf:
+            for info in zf.infolist():
+                if info.is_dir():
+                    continue
+                basename = os.path.basename(info.filename)
+                if basename in self._pathmap:
+                    # Verify that the archive does not contain multiple files of the same name.
+                    raise ValueError("More than one {} in archive".format(basename))
+                # Index member names by their basename.
+                self._pathmap[basename] = info.filename
+                # Build a lock for each file to synchronize reads.
+                self._locks[basename] = RLock()
+
+    def _open(self, filename: str) -> BinaryIO:
+        """Open a binary stream for the given file, which must exist"""
+        path = self._pathmap[filename]
+        if self._zippath is None:
+            return open(path, "rb")
+
+        # Each reader gets its own archive handle so that members can be
+        # streamed concurrently. The member stream keeps the archive open.
+        with zipfile.ZipFile(self._zippath) as zf:
+            return cast(BinaryIO, zf.open(path))
+
+    def _filesize(self, filename: str) -> int:
+        path = self._pathmap[filename]
+        if self._zippath is None:
+            return os.path.getsize(path)
+
+        with zipfile.ZipFile(self._zippath) as zf:
+            return zf.getinfo(path).file_size
+
+    def _usecols(self, filename: str) -> Optional[Set[str]]:
+        """Return the columns to read from a file, if restricted by the config
+
+        Columns used by dependency edges are always kept, so that the file
+        can still be filtered, and used to prune other files.
+        """
+        columns = self._config.nodes.get(filename, {}).get("columns")
+        if columns is None:
+            return None
+
+        usecols = setwrap(columns)
+        edges = chain(
+            self._config.in_edges(filename, data=True),
+            self._config.out_edges(filename, data=True),
+        )
+        for _, _, data in edges:
+            for deps in data.get("dependencies", []):
+                usecols.add(deps[filename])
+
+        return usecols
+
     def _read_csv(self, filename: str) -> pd.DataFrame:
-        path = self._pathmap.get(filename)
-        columns = self._config.nodes.get(filename, {}).get("required_columns", [])
+        usecols = self._usecols(filename)
 
-        if path is None or os.path.getsize(path) == 0:
+        if filename not in self._pathmap or self._filesize(filename) == 0:
             # The file is missing or empty. Return an empty
-            # DataFrame containing any required columns.
-            return empty_df(columns)
+            # DataFrame containing any required (or selected) columns.
+            columns = self._config.nodes.get(filename, {}).get("required_columns", [])
+            return empty_df(columns if usecols is None else sorted(usecols))
 
-        # If the file isn't in the zip, return an empty DataFrame.
-        with open(path, "rb") as f:
+        (df,) = self._read_csv_chunks(filename, usecols, None)
+        return df
+
+    def _read_csv_chunks(
+        self, filename: str, usecols: Optional[Set[str]], chunksize: Optional[int]
+    ) -> Generator[pd.DataFrame, None, None]:
+        """Read a file in chunks of rows, or in one piece if chunksize is None"""
+        with self._open(filename) as f:
             encoding = detect_encoding(f)
+            f.seek(0)
 
-        df = pd.read_csv(path, dtype=str, encoding=encoding, index_col=False)
+            # Skip leading whitespace while parsing. UTF-8 input is scanned
+            # on the way into the parser, so that columns only need a second
+            # pass to strip whitespace if there is any.
+            scanner = WhitespaceScanner(f) if encoding == "utf-8" else None
+            reader = pd.read_csv(
+                f if scanner is None else io.BufferedReader(scanner),
+                dtype=str,
+                encoding=encoding,
+                index_col=False,
+                skipinitialspace=True,
+                usecols=None if usecols is None else lambda c: c.strip() in usecols,
+                chunksize=chunksize,
+            )
 
-        # Strip leading/trailing whitespace from column names
-        df.rename(columns=lambda x: x.strip(), inplace=True)
+            for df in [reader] if chunksize is None else reader:
+                # Strip leading/trailing whitespace from column names
+                df.rename(columns=lambda x: x.strip(), inplace=True)
 
-        if not df.empty:
-            # Strip leading/trailing whitespace from column values
-            for col in df.columns:
-                df[col] = df[col].str.strip()
+                # The scanner has seen every byte of the chunk, so earlier
+                # chunks never need stripping if whitespace turns up later
+                if not df.empty and (scanner is None or scanner.found):
+                    # Strip leading/trailing whitespace from column values
+                    for col in df.columns:
+                        df[col] = df[col].str.strip()
 
-        return df
+                yield df
 
-    def _filter(self, filename: str, df: pd.DataFrame) -> pd.DataFrame:
-        """Apply view filters"""
-        view = self._view.get(filename)
-        if view is None:
+    def _plan_lock_for(self, layer: int, filename: str) -> RLock:
+        """Return the lock for resolving a file in a layer (-1 for the raw file)
+
+        Layers only depend on lower layers, and files on their dependencies
+        within a layer, so locks are always taken in the same order.
+        """
+        with self._plan_lock:
+            return self._plan_locks.setdefault((layer, filename), RLock())
+
+    def _read_raw(self, filename: str) -> pd.DataFrame:
+        """Return the raw file, or the rows kept while reading it in chunks"""
+        if self._streams(filename):
+            self._stream(filename)
+
+        with self._plan_lock_for(-1, filename):
+            df = self._raw.get(filename)
+            if df is None:
+                df = self._raw[filename] = self._read(filename)
             return df
 
-        for col, values in view.items():
-            # If applicable, filter this dataframe by the given set of values
-            if col in df.columns:
-                df = df[df[col].isin(setwrap(values))]
+    def _release(self, filename: str) -> None:
+        """Drop a raw file once its layers have been resolved. It is read
+        again if needed, selecting the same rows.
+        """
+        with self._plan_lock_for(-1, filename):
+            self._raw.pop(filename, None)
+            for key in [key for key in self._codes if key[0] == filename]:
+                del self._codes[key]
 
-        return df
+    def _select(self, layer: int, filename: str) -> Optional[np.ndarray]:
+        """Return the positions of the raw rows kept by a layer, or None if
+        every row is kept
+        """
+        with self._plan_lock_for(layer, filename):
+            if (layer, filename) in self._rows:
+                return self._rows[layer, filename]
+
+            if (0, filename) not in self._rows and self._streams(filename):
+                # Reading in chunks resolves the leading layers
+                self._read_raw(filename)
+                if (layer, filename) in self._rows:
+                    return self._rows[layer, filename]
+
+            previous = None if layer == 0 else self._select(layer - 1, filename)
+            rows = previous
+            config, view = self._layers[layer]
+            dependencies = self._dependencies(config, filename)
+
+            # Skip files whose filters and dependencies are unchanged
+            # from the previous layer
+            if view.get(filename) or not all(
+                self._unchanged(layer, filename, depfile, column_pairs)
+                for depfile, column_pairs in dependencies
+            ):
+                size = len(self._read_raw(filename)) if rows is None else len(rows)
+                isin = self._isin_raw(filename, rows)
+                values = self._values_raw(filename, rows)
+                mask = np.ones(size, dtype=bool)
+                mask = self._filter(layer, filename, isin, values, mask)
+                mask = self._prune(layer, filename, isin, mask, self._stats)
+                if not mask.all():
+                    rows = np.flatnonzero(mask) if rows is None else rows[mask]
+
+            self._rows[layer, filename] = rows
+            self._changed[layer, filename] = rows is not previous
+            self._index_keys(layer, filename)
+            return rows
 
-    def _prune(self, filename: str, df: pd.DataFrame) -> pd.DataFrame:
-        """Depth-first search through the dependency graph
-        and prune dependent DataFrames along the way.
+    def _unchanged(
+        self, layer: int, filename: str, depfile: str, column_pairs: List[Dict]
+    ) -> bool:
+        """Whether pruning a file by a dependency has no effect beyond the
+        previous layer
         """
+        if layer == 0:
+            return False
+
+        previous, _ = self._layers[layer - 1]
+        if not previous.has_edge(filename, depfile):
+            return False
+        if previous.edges[filename, depfile].get("dependencies") != column_pairs:
+            return False
+
+        self._select(layer, depfile)
+        return not self._changed[layer, depfile]
+
+    def _index_keys(self, layer: int, filename: str) -> None:
+        """Collect the unique values of each column that other files are
+        pruned by in a layer
+        """
+        rows = self._rows[layer, filename]
+        unchanged = layer > 0 and not self._changed[layer, filename]
+        for col in self._key_columns(layer, filename):
+            if (layer, filename, col) not in self._keys:
+
+                if unchanged and (layer - 1, filename, col) in self._keys:
+                    keys = self._keys[layer - 1, filename, col]
+                else:
+                    keys = self._unique(filename, col, rows)
+
+                self._keys[layer, filename, col] = keys
+
+    def _key_columns(self, layer: int, filename: str) -> Set[str]:
+        """Return the columns of a file that other files are pruned by in a layer"""
+        config, _ = self._layers[layer]
+        if filename not in config:
+            return set()
+
+        return {
+            deps[filename]
+            for _, _, data in config.in_edges(filename, data=True)
+            for deps in data.get("dependencies", [])
+        }
+
+    def _dependencies(
+        self, config: nx.DiGraph, filename: str
+    ) -> List[Tuple[str, List[Dict]]]:
+        if filename not in config:
+            return []
+
         dependencies = []
-        for _, depf, data in self._config.out_edges(filename, data=True):
+        for _, depf, data in config.out_edges(filename, data=True):
             deps = data.get("dependencies")
             if deps is None:
                 msg = f"Edge missing `dependencies` attribute: {filename}->{depf}"
                 raise ValueError(msg)
             dependencies.append((depf, deps))
 
-        if not dependencies:
-            return df
+        return dependencies
 
-        for depfile, column_pairs in dependencies:
-            # Read the filtered, cached file dependency
-            depdf = self.get(depfile)
+    def _factorize(
+        self, filename: str, col: str
+    ) -> Optional[Tuple[np.ndarray, pd.Index]]:
+        """Return the integer codes and unique values of a raw column, or
+        None if the file has no such column
+
+        Columns are hashed once, so that key sets and membership tests in
+        every layer work on the codes.
+        """
+        with self._plan_lock_for(-1, filename):
+            if (filename, col) not in self._codes:
+                raw = self._read_raw(filename)
+                factorized = None
+                if col in raw.columns:
+                    codes, uniques = pd.factorize(raw[col])
+                    if len(uniques) < np.iinfo(np.int32).max:
+                        codes = codes.astype(np.int32)
+                    factorized = codes, uniques
+                self._codes[filename, col] = factorized
+            return self._codes[filename, col]
+
+    def _unique(
+        self, filename: str, col: str, rows: Optional[np.ndarray]
+    ) -> Optional[pd.Index]:
+        """Return the distinct values of a column in the given rows"""
+        factorized = self._factorize(filename, col)
+        if factorized is None:
+            return None
+
+        codes, uniques = factorized
+        # Missing values have code -1, which marks the last slot
+        present = np.zeros(len(uniques) + 1, dtype=bool)
+        present[codes if rows is None else codes[rows]] = True
+        keys = uniques[present[:-1]]
+        if present[-1]:
+            # Missing values match each other, as with Series.isin
+            keys = pd.Index(np.append(keys.to_numpy(), np.nan))
+
+        return keys
+
+    def _isin_raw(
+        self, filename: str, rows: Optional[np.ndarray]
+    ) -> Callable[[str, pd.Index], Optional[np.ndarray]]:
+        """Return a membership test for the given rows of a raw file"""
+
+        def isin(col: str, keys: pd.Index) -> Optional[np.ndarray]:
+            factorized = self._factorize(filename, col)
+            if factorized is None:
+                return None
+
+            codes, uniques = factorized
+            return _lookup(codes if rows is None else codes[rows], uniques, keys)
+
+        return isin
+
+    def _values_raw(
+        self, filename: str, rows: Optional[np.ndarray]
+    ) -> Callable[[str], Optional[np.ndarray]]:
+        """Return an accessor for the values of the given rows of a raw file"""
+
+        def values(col: str) -> Optional[np.ndarray]:
+            return _values_of(self._read_raw(filename), rows)(col)
+
+        return values
+
+    def _filter(
+        self,
+        layer: int,
+        filename: str,
+        isin: Callable[[str, pd.Index], Optional[np.ndarray]],
+        values: Callable[[str], Optional[np.ndarray]],
+        mask: np.ndarray,
+    ) -> np.ndarray:
+        """Narrow a mask of rows to those matching a layer's view filters"""
+        _, view = self._layers[layer]
+        for col, wanted in view.get(filename, {}).items():
+            # If applicable, filter this file by the given set of values,
+            # or by location
+            if isinstance(wanted, SpatialFilter):
+                matches = select_within(wanted, filename, values)
+            else:
+                matches = isin(col, pd.Index(list(setwrap(wanted))))
+            if matches is not None:
+                mask &= matches
+
+        return mask
+
+    def _prune(
+        self,
+        layer: int,
+        filename: str,
+        isin: Callable[[str, pd.Index], Optional[np.ndarray]],
+        mask: np.ndarray,
+        stats: Optional[List[Tuple[int, str, str, int, int]]] = None,
+    ) -> np.ndarray:
+        """Narrow a mask of rows to those with matching rows in each of the
+        file's dependencies in a layer, appending the rows removed by each
+        dependency to `stats` if given
+        """
+        config, _ = self._layers[layer]
+        for depfile, column_pairs in self._dependencies(config, filename):
+            # Resolve the dependency first
+            self._select(layer, depfile)
+
+            # Combine the edge's column pairs before applying them
+            keep = np.ones_like(mask)
             for deps in column_pairs:
-                col = deps[filename]
-                depcol = deps[depfile]
-                # If applicable, prune this dataframe by the other
-                if col in df.columns and depcol in depdf.columns:
-                    df = df[df[col].isin(depdf[depcol])]
+                keys = self._keys[layer, depfile, deps[depfile]]
+                # If applicable, prune this file by the other
+                matches = None if keys is None else isin(deps[filename], keys)
+                if matches is not None:
+                    keep &= matches
 
-        return df
+            if stats is not None:
+                removed = int(np.count_nonzero(mask & ~keep))
+                stats.append(
+                    (layer, filename, depfile, int(np.count_nonzero(mask)), removed)
+                )
+            mask &= keep
+
+        return mask
+
+    def _iter_filtered(
+        self, filename: str, columns: Optional[List[str]], chunksize: int
+    ) -> Iterator[pd.DataFrame]:
+        """Read a file in chunks, filtering and pruning each by every layer"""
+        for chunk, mask in self._iter_masks(filename, columns, chunksize):
+            yield chunk.take(np.flatnonzero(mask))
+
+    def _iter_masks(
+        self, filename: str, columns: Optional[List[str]], chunksize: int
+    ) -> Iterator[Tuple[pd.DataFrame, np.ndarray]]:
+        """Read a file in chunks, along with a mask of the rows selected by
+        every layer
+
+        If the file would be streamed to resolve the view, its layers are
+        resolved along the way, so that files pruned by it need not read it
+        again. Its selected rows are not kept.
+        """
+        layers = range(len(self._layers))
+        usecols = self._usecols(filename)
+        resolve = self._streams(filename) and (0, filename) not in self._rows
+        key_columns = (
+            [self._key_columns(layer, filename) for layer in layers]
+            if resolve
+            else None
+        )
+        if columns is not None:
+            # Keep the columns needed for filtering and pruning
+            usecols = set(columns).union(*(key_columns or []))
+            for config, view in self._layers:
+                usecols.update(filter_columns(filename, view.get(filename, {})))
+                for _, column_pairs in self._dependencies(config, filename):
+                    usecols.update(deps[filename] for deps in column_pairs)
+
+        self._select_dependencies(filename, layers)
+        reader = self._read_csv_chunks(filename, usecols, chunksize)
+        first = next(reader, None)
+        chunks: Iterator[pd.DataFrame] = reader
+        if first is not None and len(first.columns) == 0:
+            # Rows are dropped if none of the columns are found
+            reader.close()
+            chunks = self._read_csv_chunks(filename, None, chunksize)
+        elif first is not None:
+            chunks = chain([first], reader)
+
+        return self._iter_chunk_masks(filename, chunks, layers, key_columns)
+
+    def _select_dependencies(self, filename: str, layers: Iterable[int]) -> None:
+        """Resolve the dependencies of a file in each layer before reading it"""
+        for layer in layers:
+            config, _ = self._layers[layer]
+            for depfile, _ in self._dependencies(config, filename):
+                self._select(layer, depfile)
+
+    def _iter_chunk_masks(
+        self,
+        filename: str,
+        chunks: Iterable[pd.DataFrame],
+        layers: range,
+        key_columns: Optional[List[Set[str]]],
+    ) -> Iterator[Tuple[pd.DataFrame, np.ndarray]]:
+        """Yield each chunk of a file along with a mask of the rows selected
+        by the leading layers, whose dependencies must already be resolved.
+
+        If the key columns of each layer are given, the layers are resolved
+        from the selected rows once every chunk has been read.
+        """
+        keys: DefaultDict[Tuple[int, str], List[np.ndarray]] = defaultdict(list)
+        changed = [False for _ in layers]
+        stats: List[Tuple[int, str, str, int, int]] = []
+        for chunk in chunks:
+            isin = _isin_chunk(chunk)
+            values = _values_of(chunk)
+            mask = np.ones(len(chunk), dtype=bool)
+            for layer in layers:
+                size = np.count_nonzero(mask)
+                mask = self._filter(layer, filename, isin, values, mask)
+                mask = self._prune(
+                    layer, filename, isin, mask, None if key_columns is None else stats
+                )
+                changed[layer] |= bool(np.count_nonzero(mask) < size)
+                if key_columns is None:
+                    continue
+                for col in key_columns[layer] & set(chunk.columns):
+                    keys[layer, col].append(pd.unique(chunk[col].to_numpy()[mask]))
+
+            yield chunk, mask
+
+        if key_columns is not None:
+            self._resolve_streamed(filename, key_columns, keys, changed, stats)
+
+    def _iter_raw(self, filename: str) -> Optional[Iterator[bytes]]:
+        """Return the original bytes of the header and selected rows of a
+        file, or None if the view can't be resolved one chunk at a time, or
+        the rows can't be told apart from the file's lines
+
+        If the file has been read, its table may have been replaced, so
+        None is returned as well.
+        """
+        if (
+            self._read != self._read_csv
+            or filename not in self._pathmap
+            or filename in self._cache
+            or self._usecols(filename) is not None
+            or self._pushdown_depth(filename) != len(self._layers) - 1
+        ):
+            return None
+
+        if self._filesize(filename) == 0:
+            return iter([])
+
+        # Only read the columns needed to filter and prune the file
+        masks = [mask for _, mask in self._iter_masks(filename, [], self._chunksize)]
+        keep = np.concatenate(masks) if masks else np.zeros(0, dtype=bool)
+        if not keep.any():
+            return iter([])
+        if keep.all():
+            return self._iter_bytes(filename)
+        if not self._has_a_row_per_line(filename):
+            return None
+
+        return self._iter_lines(filename, keep)
+
+    def _iter_bytes(self, filename: str) -> Iterator[bytes]:
+        with self._open(filename) as f:
+            yield from iter(lambda: f.read(2 ** 20), b"")
+
+    def _iter_lines(self, filename: str, keep: np.ndarray) -> Iterator[bytes]:
+        """Yield the header line and the kept lines of a file, in blocks"""
+        with self._open(filename) as f:
+            # Blank lines are skipped by the CSV parser
+            lines = (line for line in f if line.strip())
+            block = [next(lines)]
+            count = 0
+            for kept, line in zip(keep, lines):
+                count += 1
+                if kept:
+                    block.append(line)
+                    if len(block) >= 10000:
+                        yield b"".join(block)
+                        block = []
+
+            if count != len(keep) or next(lines, None) is not None:
+                raise ValueError("Lines do not match rows in {}".format(filename))
+
+            yield b"".join(block)
+
+    def _has_a_row_per_line(self, filename: str) -> bool:
+        """Whether each non-blank line of a file after the header holds a
+        row, i.e. lines end in \\n or \\r\\n, the encoding is a superset of
+        ASCII, and no quoted value spans lines
+        """
+        with self._open(filename) as f:
+            for block in iter(lambda: f.read(2 ** 20) + f.readline(), b""):
+                if b"\0" in block or block.count(b"\r") != block.count(b"\r\n"):
+                    return False
+                if b'"' in block and any(
+                    line.count(b'"') % 2 for line in block.split(b"\n")
+                ):
+                    return False
+
+        return True
+
+    def _slices(
+        self, df: pd.DataFrame, rows: Optional[np.ndarray], chunksize: int
+    ) -> Iterator[pd.DataFrame]:
+        """Take the given rows of a table in chunks"""
+        size = len(df) if rows is None else len(rows)
+        for start in range(0, size, chunksize):
+            if rows is None:
+                yield df.iloc[start : start + chunksize].copy()
+            else:
+                yield df.take(rows[start : start + chunksize])
+
+    def _streams(self, filename: str) -> bool:
+        """Whether a file is large enough to be read in chunks"""
+        streams = self._streaming.get(filename)
+        if streams is None:
+            streams = self._streaming[filename] = (
+                self._read == self._read_csv
+                and filename in self._pathmap
+                and self._filesize(filename) >= self._stream_threshold
+            )
+        return streams
+
+    def _stream(self, filename: str) -> None:
+        """Read a file in chunks, resolving the leading layers of the view
+        for each chunk, so that only the rows they select are kept
+        """
+        if filename in self._raw:
+            return
+
+        depth = self._pushdown_depth(filename)
+        layers = range(depth + 1)
+        self._select_dependencies(filename, layers)
+
+        with self._plan_lock_for(-1, filename):
+            if filename in self._raw:
+                return
+
+            # The file is read again after being released, selecting the
+            # same rows, but the layers are only resolved once
+            key_columns = (
+                None
+                if (0, filename) in self._rows
+                else [self._key_columns(layer, filename) for layer in layers]
+            )
+            chunks = self._read_csv_chunks(
+                filename, self._usecols(filename), self._chunksize
+            )
+            masked = self._iter_chunk_masks(filename, chunks, layers, key_columns)
+            self._raw[filename] = pd.concat(
+                [chunk[mask] for chunk, mask in masked], ignore_index=True
+            )
+
+    def _resolve_streamed(
+        self,
+        filename: str,
+        key_columns: List[Set[str]],
+        keys: Dict[Tuple[int, str], List[np.ndarray]],
+        changed: List[bool],
+        stats: List[Tuple[int, str, str, int, int]],
+    ) -> None:
+        """Record the layers of a file resolved while reading it in chunks.
+        The file's raw rows are those kept by the last of these layers.
+        """
+        with self._plan_lock_for(-1, filename):
+            if (0, filename) in self._rows:
+                return
+
+            self._stats.extend(stats)
+            for layer, columns in enumerate(key_columns):
+                self._rows[layer, filename] = None
+                self._changed[layer, filename] = changed[layer]
+                for col in columns:
+                    values = keys.get((layer, col))
+                    self._keys[layer, filename, col] = (
+                        None
+                        if values is None
+                        else pd.Index(pd.unique(np.concatenate(values)))
+                    )
+
+    def _pushdown_depth(self, filename: str) -> int:
+        """Return the last layer of the view that a file can be resolved in
+        one chunk at a time, before its dependencies depend on its own rows
+        """
+        for layer, (config, _) in enumerate(self._layers):
+            for depfile, _ in self._dependencies(config, filename):
+                if self._depends_on(layer, depfile, filename):
+                    return layer - 1
+
+        return len(self._layers) - 1
+
+    def _depends_on(self, layer: int, filename: str, target: str) -> bool:
+        """Whether resolving a file in a layer involves the target file in
+        any layer
+        """
+        stack = [(layer, filename)]
+        seen = set()
+        while stack:
+            layer, filename = stack.pop()
+            if filename == target:
+                return True
+            if (layer, filename) in seen:
+                continue
+
+            seen.add((layer, filename))
+            if layer > 0:
+                stack.append((layer - 1, filename))
+            config, _ = self._layers[layer]
+            for depfile, _ in self._dependencies(config, filename):
+                stack.append((layer, depfile))
+
+        return False
 
     def _convert_types(self, filename: str, df: pd.DataFrame) -> None:
         """
@@ -162,6 +1018,56 @@ class Feed(object):
             if col in df.columns:
                 df[col] = converter(df[col])
 
+    def _categorize(self, filename: str, df: pd.DataFrame) -> None:
+        """
+        Store identifier columns as categoricals, sharing categories with
+        every other column of the same domain (e.g. trip_id in trips.txt
+        and stop_times.txt), so that values have the same codes throughout
+        the feed.
+        """
+        for col in df.columns:
+            domain = self._domains.get((filename, col))
+            if domain is None:
+                continue
+
+            values = df[col]
+            uniques = pd.Index(
+                values.cat.categories
+                if isinstance(values.dtype, pd.CategoricalDtype)
+                else values.dropna().unique()
+            )
+
+            with self._categories_lock:
+                categories = self._categories.get(domain, pd.Index([], dtype=object))
+                new = uniques.difference(categories, sort=False)
+                if len(new):
+                    # Append, so that existing values keep their codes
+                    categories = categories.append(new)
+                    self._categories[domain] = categories
+                    self._extend_categories(domain, categories)
+
+            df[col] = pd.Categorical(values, categories=categories)
+
+    def _extend_categories(self, domain: str, categories: pd.Index) -> None:
+        """Update cached identifier columns to the latest categories"""
+        with self._cache_lock:
+            for (filename, col), other in self._domains.items():
+                df = self._cache.get(filename)
+                if (
+                    other != domain
+                    or df is None
+                    or col not in df.columns
+                    # Tables installed with `set` may not be categorized
+                    or not isinstance(df[col].dtype, pd.CategoricalDtype)
+                ):
+                    continue
+
+                # Replace the cached table rather than updating it in place,
+                # leaving frames already handed out untouched
+                df = df.copy(deep=False)
+                df[col] = df[col].cat.set_categories(categories)
+                self._cache[filename] = df
+
     def _transform(self, filename: str, df: pd.DataFrame) -> pd.DataFrame:
         transformations = self._config.nodes.get(filename, {}).get(
             "transformations", []
@@ -171,3 +1077,71 @@ class Feed(object):
             df = transform(df)
 
         return df
+
+
+def _lookup(codes: np.ndarray, uniques: pd.Index, keys: pd.Index) -> np.ndarray:
+    """Return a mask of the factorized values found in keys"""
+    # Look up each distinct value once, and missing values (code -1)
+    # in the last slot. Missing values match each other, as with Series.isin
+    return np.append(keys.get_indexer(uniques) >= 0, keys.hasnans)[codes]
+
+
+def _isin_chunk(
+    chunk: pd.DataFrame,
+) -> Callable[[str, pd.Index], Optional[np.ndarray]]:
+    """Return a membership test for the rows of a chunk"""
+
+    def isin(col: str, keys: pd.Index) -> Optional[np.ndarray]:
+        if col not in chunk.columns:
+            return None
+
+        codes, uniques = pd.factorize(chunk[col])
+        return _lookup(codes, uniques, keys)
+
+    return isin
+
+
+def _values_of(
+    df: pd.DataFrame, rows: Optional[np.ndarray] = None
+) -> Callable[[str], Optional[np.ndarray]]:
+    """Return an accessor for the values of the given rows of a table"""
+
+    def values(col: str) -> Optional[np.ndarray]:
+        if col not in df.columns:
+            return None
+
+        array = df[col].to_numpy()
+        return array if rows is None else array[rows]
+
+    return values
+
+
+def _run_in_dependency_order(
+    config: nx.DiGraph,
+    nodes: Iterable[str],
+    func: Callable[[str], object],
+    max_workers: Optional[int] = None,
+) -> None:
+    """Call a function on each node in a thread pool, once the node's
+    dependencies among the given nodes have been processed
+    """
+    nodes = set(nodes)
+    waiting = {
+        node: nodes.intersection(config.successors(node)) if node in config else set()
+        for node in nodes
+    }
+
+    with ThreadPoolExecutor(max_workers) as pool:
+        running: Dict[Future, str] = {}
+        while waiting or running:
+            for node in [n for n, deps in waiting.items() if not deps]:
+                del waiting[node]
+                running[pool.submit(func, node)] = node
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                node = running.pop(future)
+                # Raise the first error, cancelling anything not yet started
+                future.result()
+                for deps in waiting.values():
+                    deps.discard(node)
@@ -0,0 +1,216 @@
+import os
+from threading import Lock
+from typing import Callable, List, Mapping, Optional, Sequence, Tuple, Union
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+from .config import default_config, id_domains
+from .gtfs import Feed
+from .readers import _load_feed, load_raw_feed
+from .types import View
+from .utilities import empty_df
+
+
+Namespace = Union[str, Callable[[str, pd.Series], pd.Series]]
+
+# Identifier columns that are not joined by the dependency graph
+EXTRA_ID_COLUMNS = {
+    ("fare_attributes.txt", "agency_id"): "agency_id",
+    ("stops.txt", "parent_station"): "stop_id",
+    ("trips.txt", "block_id"): "block_id",
+}
+
+
+def merge_feeds(
+    sources: Union[Sequence[str], Mapping[str, Namespace]],
+    view: Optional[View] = None,
+    config: Optional[nx.DiGraph] = None,
+    dedupe_stops: bool = True,
+    categorical_ids: bool = False,
+    memory_budget: Optional[int] = None,
+) -> Feed:
+    """Load several GTFS feeds as a single feed
+
+    `sources` maps each feed's path to the namespace of its identifiers:
+    either a prefix, or a function called with the name of the identifier
+    (e.g. `"stop_id"`) and a Series of raw values, returning the values to
+    use instead. Given a sequence of paths, each feed's identifiers are
+    prefixed with its file name, e.g. `"caltrain-2017-07-24:"`.
+
+    Identifier columns are those joined by the config's dependency edges,
+    plus `parent_station`, `block_id` and the `agency_id` of fares.
+
+    If `dedupe_stops` is True, a stop that is identical (apart from its
+    identifiers) to a stop of an earlier feed is dropped, and references
+    to it point to the earlier stop.
+
+    Files are merged lazily, when first read, and the view is applied to
+    the merged feed.
+    """
+    config = default_config() if config is None else config
+    view = {} if view is None else view
+
+    if not nx.is_directed_acyclic_graph(config):
+        raise ValueError("Config must be a DAG")
+
+    if not isinstance(sources, Mapping):
+        sources = {path: _default_namespace(path) for path in sources}
+        if len(set(sources.values())) < len(sources):
+            raise ValueError("Feeds must have different file names")
+
+    merger = _FeedMerger(sources, config, dedupe_stops)
+
+    return _load_feed(
+        merger.read,
+        view,
+        config,
+        categorical_ids=categorical_ids,
+        memory_budget=memory_budget,
+    )
+
+
+class _FeedMerger(object):
+    def __init__(
+        self, sources: Mapping[str, Namespace], config: nx.DiGraph, dedupe_stops: bool
+    ):
+        self._feeds: List[Tuple[Feed, Namespace]] = [
+            (load_raw_feed(path), namespace) for path, namespace in sources.items()
+        ]
+        self._domains = {**EXTRA_ID_COLUMNS, **id_domains(config)}
+        self._dedupe_stops = dedupe_stops
+        self._duplicates: Optional[pd.Series] = None
+        # Stops concatenated to find duplicates before stops.txt was read
+        self._stops: Optional[pd.DataFrame] = None
+        self._lock = Lock()
+
+    def read(self, filename: str) -> pd.DataFrame:
+        """Return the raw file of every feed, concatenated"""
+        if filename == "stops.txt" and self._dedupe_stops:
+            df = self._concat_stops()
+        else:
+            df, _ = self._concat(filename)
+        if not self._dedupe_stops or df.empty:
+            return df
+
+        duplicates = self._duplicate_stops()
+        if filename == "stops.txt" and len(duplicates):
+            df = df[~df.stop_id.isin(duplicates.index)].reset_index(drop=True)
+
+        for col in df.columns:
+            if self._domains.get((filename, col)) == "stop_id":
+                kept = df[col].map(duplicates)
+                df[col] = kept.where(kept.notna(), df[col])
+
+        return df
+
+    def _concat(self, filename: str) -> Tuple[pd.DataFrame, np.ndarray]:
+        """Concatenate a file of every feed, namespacing identifiers. Also
+        return the position of the feed each row came from.
+        """
+        frames = []
+        sources = []
+        for i, (feed, namespace) in enumerate(self._feeds):
+            df = feed.get(filename)
+            # The merged feed holds on to the rows it needs
+            feed.evict(filename)
+            if df.empty:
+                continue
+
+            df = df.copy()
+            if (filename, "agency_id") in self._domains:
+                self._fill_agency_id(feed, df)
+
+            for col in df.columns:
+                domain = self._domains.get((filename, col))
+                if domain is not None:
+                    df[col] = _apply_namespace(namespace, domain, df[col])
+
+            frames.append(df)
+            sources.append(np.full(len(df), i))
+
+        if not frames:
+            return empty_df(), np.array([], dtype=int)
+
+        df = pd.concat(frames, ignore_index=True, sort=False)
+        return df, np.concatenate(sources)
+
+    def _fill_agency_id(self, feed: Feed, df: pd.DataFrame) -> None:
+        """The agency ID may be omitted by feeds with a single agency, but
+        not once they are merged with other feeds
+        """
+        agency = feed.get("agency.txt")
+        if len(agency) != 1 or "agency_id" not in agency.columns:
+            return
+
+        agency_id = agency.agency_id.iloc[0]
+        if "agency_id" in df.columns:
+            df["agency_id"] = df.agency_id.fillna(agency_id)
+        else:
+            df["agency_id"] = agency_id
+
+    def _concat_stops(self) -> pd.DataFrame:
+        """Concatenate the stops of every feed, finding duplicate stops
+        along the way if they haven't been found yet
+        """
+        with self._lock:
+            if self._stops is not None:
+                stops, self._stops = self._stops, None
+                return stops
+
+            stops, sources = self._concat("stops.txt")
+            if self._duplicates is None:
+                self._duplicates = self._find_duplicate_stops(stops, sources)
+            return stops
+
+    def _duplicate_stops(self) -> pd.Series:
+        """Map the ID of each stop identical to a stop of an earlier feed to
+        the ID of the earlier stop
+        """
+        with self._lock:
+            if self._duplicates is None:
+                stops, sources = self._concat("stops.txt")
+                self._duplicates = self._find_duplicate_stops(stops, sources)
+                # Keep the stops for reading stops.txt, rather than
+                # concatenating them again
+                self._stops = stops
+            return self._duplicates
+
+    def _find_duplicate_stops(
+        self, stops: pd.DataFrame, sources: np.ndarray
+    ) -> pd.Series:
+        columns = [
+            col for col in stops.columns if ("stops.txt", col) not in self._domains
+        ]
+        return _find_duplicates(stops, sources, "stop_id", columns)
+
+
+def _find_duplicates(
+    df: pd.DataFrame, sources: np.ndarray, key: str, columns: List[str]
+) -> pd.Series:
+    """Map the key of each row that has the same values in `columns` as a
+    row from an earlier source to the key of the first such row
+    """
+    if df.empty or key not in df.columns or not columns:
+        return pd.Series([], dtype=object)
+
+    groups = df.groupby(columns, dropna=False, sort=False).ngroup().to_numpy()
+    _, first = np.unique(groups, return_index=True)
+    first = first[groups]
+    duplicated = sources[first] != sources
+
+    keys = df[key].to_numpy()
+    duplicates = pd.Series(keys[first][duplicated], index=keys[duplicated])
+    return duplicates[~duplicates.index.duplicated()]
+
+
+def _apply_namespace(namespace: Namespace, domain: str, values: pd.Series) -> pd.Series:
+    if callable(namespace):
+        return namespace(domain, values)
+    return namespace + values
+
+
+def _default_namespace(path: str) -> str:
+    name, _ = os.path.splitext(os.path.basename(os.path.normpath(path)))
+    return name + ":"
@@ -1,6 +1,9 @@
 import datetime
 from functools import lru_cache
+from typing import Iterable, Tuple, Union
+
 import numpy as np
+import pandas as pd
 
 DATE_FORMAT = "%Y%m%d"
 
@@ -27,5 +30,136 @@ def parse_date(val: str) -> datetime.date:
     return datetime.datetime.strptime(val, DATE_FORMAT).date()
 
 
-vparse_date = np.vectorize(parse_date)
-vparse_time = np.vectorize(parse_time)
+def _parse_times(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Parse unique, non-null time strings into integer seconds, along with
+    a boolean mask of blank values"""
+    arr = np.char.strip(values.astype(str))
+    n = arr.shape[0]
+    seconds = np.zeros(n, dtype=np.int64)
+    blank = arr == ""
+
+    if n == 0:
+        return seconds, blank
+
+    # Right-justify values so that seconds and minutes occupy the last
+    # five columns of a fixed-width character matrix.
+    width = max(arr.dtype.itemsize // 4, 8)
+    chars = np.char.rjust(arr, width).view(np.uint32).reshape(n, width)
+
+    def digit(col: int) -> np.ndarray:
+        return chars[:, col].astype(np.int64) - ord("0")
+
+    def is_digit(col: int) -> np.ndarray:
+        return (chars[:, col] >= ord("0")) & (chars[:, col] <= ord("9"))
+
+    valid = (chars[:, -3] == ord(":")) & (chars[:, -6] == ord(":"))
+    for col in (-1, -2, -4, -5):
+        valid &= is_digit(col)
+
+    # Hours need at least one digit, preceded only by padding
+    valid &= is_digit(-7)
+    hours = np.zeros(n, dtype=np.int64)
+    padding = np.ones(n, dtype=bool)
+    for col in range(width - 6):
+        padding &= chars[:, col] == ord(" ")
+        valid &= padding | is_digit(col)
+        hours = np.where(padding, 0, hours * 10 + digit(col))
+
+    seconds = (
+        hours * 3600 + (digit(-5) * 10 + digit(-4)) * 60 + digit(-2) * 10 + digit(-1)
+    )
+    seconds[blank] = 0
+
+    for i in np.flatnonzero(~valid & ~blank):
+        # Handle unusual (or malformed) values one at a time
+        seconds[i] = parse_time(arr[i])
+
+    return seconds, blank
+
+
+def vparse_time(
+    values: Iterable, as_int: bool = False
+) -> Union[np.ndarray, pd.arrays.IntegerArray]:
+    """Parse an array of H:MM:SS strings into seconds since midnight
+
+    Hours may exceed 24 and have any number of digits. Blank and missing
+    values become NaN. Each distinct value is parsed once, using array
+    arithmetic on its characters; values outside the canonical layout fall
+    back to `parse_time`, which raises ValueError for malformed input.
+
+    By default, returns a float64 array (to allow NaN). With `as_int=True`,
+    returns a nullable Int64 array instead.
+    """
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+    seconds, blank = _parse_times(np.asarray(uniques, dtype=object))
+
+    # Missing values have a code of -1
+    seconds = np.append(seconds, 0)[codes]
+    missing = np.append(blank, True)[codes]
+
+    if as_int:
+        return pd.arrays.IntegerArray(seconds, missing)
+
+    result = seconds.astype(np.float64)
+    result[missing] = np.nan
+    return result
+
+
+def _parse_dates(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Parse unique, non-null YYYYMMDD strings into datetime64[D], with NaT
+    for blank values and a boolean mask of invalid values"""
+    arr = np.char.strip(values.astype(str))
+    n = arr.shape[0]
+    blank = arr == ""
+
+    # Strings shorter than eight characters are padded with NUL characters,
+    # which will fail the digit check below.
+    chars = arr.astype("U8").view(np.uint32).reshape(n, 8).astype(np.int64)
+    digits = chars - ord("0")
+    valid = ((digits >= 0) & (digits <= 9)).all(axis=1)
+    valid &= np.char.str_len(arr) == 8
+
+    powers = 10 ** np.arange(7, -1, -1, dtype=np.int64)
+    year = digits[:, :4] @ powers[4:]
+    month = digits[:, 4:6] @ powers[6:]
+    day = digits[:, 6:] @ powers[6:]
+    valid &= (month >= 1) & (month <= 12)
+
+    months = np.where(valid, (year - 1970) * 12 + month - 1, 0).astype("datetime64[M]")
+    first = months.astype("datetime64[D]")
+    days_in_month = ((months + 1).astype("datetime64[D]") - first).astype(np.int64)
+    valid &= (day >= 1) & (day <= days_in_month)
+
+    dates = first + np.where(valid, day - 1, 0)
+    dates[blank] = np.datetime64("NaT")
+
+    return dates, ~valid & ~blank
+
+
+def vparse_date(values: Iterable, as_date: bool = False) -> np.ndarray:
+    """Parse an array of YYYYMMDD strings into a datetime64[D] array
+
+    Blank and missing values become NaT. Each distinct value is parsed once,
+    using integer arithmetic on its digits. Raises ValueError listing the
+    offending rows if any value is not a valid date.
+
+    With `as_date=True`, returns an object array of `datetime.date` instead
+    (with None for missing values).
+    """
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+    dates, invalid = _parse_dates(np.asarray(uniques, dtype=object))
+
+    if invalid.any():
+        rows = np.flatnonzero(np.append(invalid, False)[codes])
+        sample = ", ".join("{}: {!r}".format(i, uniques[codes[i]]) for i in rows[:10])
+        more = "" if len(rows) <= 10 else ", ..."
+        msg = "Invalid dates (expected YYYYMMDD) in {} rows: {}{}"
+        raise ValueError(msg.format(len(rows), sample, more))
+
+    # Missing values have a code of -1
+    result = np.append(dates, np.datetime64("NaT", "D"))[codes]
+
+    if as_date:
+        return result.astype(object)
+
+    return result
@@ -3,17 +3,36 @@ import datetime
 import os
 import shutil
 import tempfile
-from typing import DefaultDict, Dict, FrozenSet, Optional, Set, Tuple
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    DefaultDict,
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 import weakref
+import zipfile
 
 from isoweek import Week
 import networkx as nx
+import numpy as np
+import pandas as pd
 
 from .config import default_config, geo_config, empty_config, reroot_graph
 from .gtfs import Feed
 from .parsers import vparse_date
+from .spatial import COORDINATE_COLUMNS, SpatialFilter, filter_columns
 from .types import View
-from .utilities import remove_node_attributes
+from .utilities import setwrap
+
+if TYPE_CHECKING:
+    from .cache import FeedCache
 
 
 DAY_NAMES = (
@@ -28,24 +47,112 @@ DAY_NAMES = (
 
 
 def load_feed(
-    path: str, view: Optional[View] = None, config: Optional[nx.DiGraph] = None
+    path: str,
+    view: Optional[View] = None,
+    config: Optional[nx.DiGraph] = None,
+    cache_dir: Optional[str] = None,
+    cache_max_bytes: Optional[int] = None,
+    columns: Optional[Dict[str, Iterable[str]]] = None,
+    categorical_ids: bool = False,
+    prefetch: Union[bool, Iterable[str]] = False,
+    chunksize: Optional[int] = None,
+    stream_threshold: Optional[int] = None,
+    memory_budget: Optional[int] = None,
 ) -> Feed:
+    """Load a GTFS feed from a zip file or directory
+
+    The view maps files to filters on their columns, e.g.
+    `{"trips.txt": {"route_id": ["1", "2"]}}`. Stops can also be filtered by
+    location with a `partridge.spatial.BoundingBox` or `Polygon`, under any
+    key: `{"stops.txt": {"geometry": BoundingBox(...)}}`. Filters propagate
+    to the files that depend on the filtered file.
+
+    If `columns` is given, only the listed columns (plus any columns needed
+    for filtering and pruning) are read from each listed file. Projections can
+    also be set with the `columns` attribute of config nodes.
+
+    If `categorical_ids` is True, identifier columns joined by the config's
+    dependency edges are stored as categoricals. All columns of the same kind
+    of identifier share categories, so joins between files compare codes.
+
+    If `cache_dir` is given, parsed tables are cached on disk, keyed by the
+    feed contents, view and config, and reused by later loads. The least
+    recently used tables are evicted once the cache exceeds `cache_max_bytes`.
+    Requires pyarrow.
+
+    Files are read lazily on first access. Pass `prefetch=True` to read every
+    file in the config up front, or an iterable of filenames to read those
+    files and their dependencies. Independent files are read in a thread
+    pool, which overlaps I/O latency but not parsing (see `Feed.load_all`).
+
+    Files of at least `stream_threshold` bytes (uncompressed) are read in
+    chunks of `chunksize` rows. View filters and pruning are applied to each
+    chunk as far as the dependency graph allows, so that only the selected
+    rows are kept in memory.
+
+    If `memory_budget` is given, the least recently used tables are evicted
+    once the feed's tables take up more than `memory_budget` bytes, and read
+    again on their next use.
+    """
     config = default_config() if config is None else config
     view = {} if view is None else view
 
     if not nx.is_directed_acyclic_graph(config):
         raise ValueError("Config must be a DAG")
 
-    if os.path.isdir(path):
-        feed = _load_feed(path, view, config)
-    elif os.path.isfile(path):
-        feed = _unpack_feed(path, view, config)
+    config = _project_columns(config, view, columns or {})
+
+    if os.path.isfile(path) and not zipfile.is_zipfile(path):
+        # Other archives, such as tarballs, are unpacked to a temporary
+        # directory, removed along with the feed
+        source = _unpack_archive(path)
+    elif os.path.exists(path):
+        source = path
     else:
         raise ValueError("File or path not found: {}".format(path))
 
+    cache = None
+    if cache_dir is not None:
+        from .cache import DEFAULT_MAX_BYTES, FeedCache, cache_key
+
+        max_bytes = DEFAULT_MAX_BYTES if cache_max_bytes is None else cache_max_bytes
+        cache = FeedCache(cache_dir, cache_key(path, view, config), max_bytes)
+
+    feed = _load_feed(
+        source,
+        view,
+        config,
+        cache,
+        categorical_ids,
+        chunksize=chunksize,
+        stream_threshold=stream_threshold,
+        memory_budget=memory_budget,
+    )
+    if source != path:
+        weakref.finalize(feed, shutil.rmtree, source, True)
+
+    if prefetch is True:
+        feed.load_all()
+    elif prefetch:
+        feed.load_all(prefetch)
+
     return feed
 
 
+def _unpack_archive(path: str) -> str:
+    """Unpack an archive to a temporary directory"""
+    tmpdir = tempfile.mkdtemp()
+    try:
+        shutil.unpack_archive(path, tmpdir)
+    except (shutil.ReadError, ValueError):
+        shutil.rmtree(tmpdir, ignore_errors=True)
+        raise ValueError("File is not a supported archive: {}".format(path))
+    except BaseException:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+        raise
+    return tmpdir
+
+
 def load_raw_feed(path: str) -> Feed:
     return load_feed(path, view={}, config=empty_config())
 
@@ -86,32 +193,73 @@ def read_trip_counts_by_date(path: str) -> Dict[datetime.date, int]:
     return _trip_counts_by_date(feed)
 
 
-def _unpack_feed(path: str, view: View, config: nx.DiGraph) -> Feed:
-    tmpdir = tempfile.mkdtemp()
-    shutil.unpack_archive(path, tmpdir)
-    feed: Feed = _load_feed(tmpdir, view, config)
-
-    # Eager cleanup
-    feed._delete_after_reading = True
+def read_trip_counts_by_date_and_route(path: str, by: str = "route_id") -> pd.DataFrame:
+    """Count trips per date for each route (or other trips.txt column)
 
-    def finalize() -> None:
-        shutil.rmtree(tmpdir)
-
-    # Lazy cleanup
-    weakref.finalize(feed, finalize)
+    Pass `by="agency_id"` to count trips per agency. Returns a DataFrame with
+    `date`, `by` and `trip_count` columns, with one row for each date and
+    group with at least one trip.
+    """
+    feed = load_raw_feed(path)
+    return _trip_counts_by_date_and_group(feed, by)
 
-    return feed
 
+def _project_columns(
+    config: nx.DiGraph, view: View, columns: Dict[str, Iterable[str]]
+) -> nx.DiGraph:
+    """Return a copy of the config with column projections set on its nodes,
+    keeping any columns filtered by the view
+    """
+    config = config.copy()
+    for filename, cols in columns.items():
+        config.add_node(filename, columns=setwrap(cols))
 
-def _load_feed(path: str, view: View, config: nx.DiGraph) -> Feed:
-    """Multi-file feed filtering"""
-    config_ = remove_node_attributes(config, ["converters", "transformations"])
-    feed_ = Feed(path, view={}, config=config_)
     for filename, column_filters in view.items():
+        data = config.nodes.get(filename, {})
+        if data.get("columns") is not None:
+            data["columns"] = setwrap(data["columns"]) | filter_columns(
+                filename, column_filters
+            )
+
+    return config
+
+
+def _load_feed(
+    path: Union[str, Callable[[str], pd.DataFrame]],
+    view: View,
+    config: nx.DiGraph,
+    cache: Optional["FeedCache"] = None,
+    categorical_ids: bool = False,
+    chunksize: Optional[int] = None,
+    stream_threshold: Optional[int] = None,
+    memory_budget: Optional[int] = None,
+) -> Feed:
+    """Multi-file feed filtering
+
+    Each view entry is applied in turn to the graph rerooted at its file, so
+    that the filter propagates to every other file. The layers are resolved
+    together by a single feed, which reads each file once.
+    """
+    layers: List[Tuple[nx.DiGraph, View]] = [(config, {})]
+    config_ = config
+    for filename, column_filters in view.items():
+        for values in column_filters.values():
+            if isinstance(values, SpatialFilter) and filename not in COORDINATE_COLUMNS:
+                raise ValueError("Cannot filter {} by location".format(filename))
+
         config_ = reroot_graph(config_, filename)
-        view_ = {filename: column_filters}
-        feed_ = Feed(feed_, view=view_, config=config_)
-    return Feed(feed_, config=config)
+        layers.append((config_, {filename: column_filters}))
+
+    return Feed(
+        path,
+        config=config,
+        cache=cache,
+        categorical_ids=categorical_ids,
+        layers=layers,
+        chunksize=chunksize,
+        stream_threshold=stream_threshold,
+        memory_budget=memory_budget,
+    )
 
 
 def _busiest_date(feed: Feed) -> Tuple[datetime.date, FrozenSet[str]]:
@@ -149,67 +297,89 @@ def _busiest_week(feed: Feed) -> Dict[datetime.date, FrozenSet[str]]:
     return {date: service_ids_by_date[date] for date in dates}
 
 
-def _service_ids_by_date(feed: Feed) -> Dict[datetime.date, FrozenSet[str]]:
-    results: DefaultDict[datetime.date, Set[str]] = defaultdict(set)
-    removals: DefaultDict[datetime.date, Set[str]] = defaultdict(set)
-
+def _service_matrix(feed: Feed) -> Tuple[pd.Index, np.ndarray, np.ndarray]:
+    """Expand calendar.txt and calendar_dates.txt into a dense boolean
+    matrix of service_ids (rows) by dates (columns)
+    """
     service_ids = set(feed.trips.service_id)
     calendar = feed.calendar
     caldates = feed.calendar_dates
 
     if not calendar.empty:
         # Only consider calendar.txt rows with applicable trips
-        calendar = calendar[calendar.service_id.isin(service_ids)].copy()
+        calendar = calendar[calendar.service_id.isin(service_ids)]
 
     if not caldates.empty:
         # Only consider calendar_dates.txt rows with applicable trips
-        caldates = caldates[caldates.service_id.isin(service_ids)].copy()
+        caldates = caldates[caldates.service_id.isin(service_ids)]
+
+    # Parse dates
+    no_dates = np.array([], dtype="datetime64[D]")
+    start_dates = no_dates if calendar.empty else vparse_date(calendar.start_date)
+    end_dates = no_dates if calendar.empty else vparse_date(calendar.end_date)
+    exception_dates = no_dates if caldates.empty else vparse_date(caldates.date)
+
+    all_dates = np.concatenate([start_dates, end_dates, exception_dates])
+    if all_dates.size == 0:
+        return pd.Index([]), all_dates, np.zeros((0, 0), dtype=bool)
+
+    first = all_dates.min()
+    dates = np.arange(first, all_dates.max() + 1)
+    offsets = np.arange(dates.size)
+
+    ids = []
+    if not calendar.empty:
+        ids.append(calendar.service_id)
+    if not caldates.empty:
+        ids.append(caldates.service_id)
+    services = pd.Index(pd.concat(ids).unique()).sort_values()
+
+    matrix = np.zeros((services.size, dates.size), dtype=bool)
 
     if not calendar.empty:
-        # Parse dates
-        calendar.start_date = vparse_date(calendar.start_date)
-        calendar.end_date = vparse_date(calendar.end_date)
+        # Build up a (calendar row x date) mask from each calendar range
+        start = (start_dates - first).astype(np.int64)
+        end = (end_dates - first).astype(np.int64)
+        active = (offsets >= start[:, None]) & (offsets <= end[:, None])
 
-        # Build up results dict from calendar ranges
-        for _, cal in calendar.iterrows():
-            start = cal.start_date.toordinal()
-            end = cal.end_date.toordinal()
+        # Apply day of week flags. 1970-01-01 was a Thursday.
+        weekdays = (dates.astype(np.int64) + 3) % 7
+        dow = calendar[list(DAY_NAMES)].astype(int).to_numpy() != 0
+        active &= dow[:, weekdays]
 
-            dow = {i: cal[day] for i, day in enumerate(DAY_NAMES)}
-            for ordinal in range(start, end + 1):
-                date = datetime.date.fromordinal(ordinal)
-                if int(dow[date.weekday()]):
-                    results[date].add(cal.service_id)
+        # Combine calendar rows by service_id
+        np.logical_or.at(matrix, services.get_indexer(calendar.service_id), active)
 
     if not caldates.empty:
-        # Parse dates
-        caldates.date = vparse_date(caldates.date)
+        rows = services.get_indexer(caldates.service_id)
+        cols = (exception_dates - first).astype(np.int64)
 
-        # Split out additions and removals
-        cdadd = caldates[caldates.exception_type == "1"]
-        cdrem = caldates[caldates.exception_type == "2"]
+        # Apply additions, then removals
+        added = (caldates.exception_type == "1").to_numpy()
+        removed = (caldates.exception_type == "2").to_numpy()
+        matrix[rows[added], cols[added]] = True
+        matrix[rows[removed], cols[removed]] = False
 
-        # Add to results by date
-        for _, cd in cdadd.iterrows():
-            results[cd.date].add(cd.service_id)
+    return services, dates, matrix
 
-        # Collect removals
-        for _, cd in cdrem.iterrows():
-            removals[cd.date].add(cd.service_id)
 
-        # Finally, process removals by date
-        for date in removals:
-            for service_id in removals[date]:
-                if service_id in results[date]:
-                    results[date].remove(service_id)
+def _service_ids_by_date(feed: Feed) -> Dict[datetime.date, FrozenSet[str]]:
+    services, dates, matrix = _service_matrix(feed)
 
-            # Drop the key from results if no service present
-            if len(results[date]) == 0:
-                del results[date]
+    # Drop dates without service
+    active = matrix.any(axis=0)
+    matrix = matrix[:, active]
+    dates = dates[active]
 
-    assert results, "No service found in feed."
+    assert dates.size, "No service found in feed."
 
-    return {k: frozenset(v) for k, v in results.items()}
+    # Build each distinct set of service_ids only once
+    patterns, inverse = np.unique(matrix.T, axis=0, return_inverse=True)
+    service_ids = [frozenset(services[pattern]) for pattern in patterns]
+
+    return {
+        date: service_ids[i] for date, i in zip(dates.astype(object), inverse.ravel())
+    }
 
 
 def _dates_by_service_ids(feed: Feed) -> Dict[FrozenSet[str], FrozenSet[datetime.date]]:
@@ -220,10 +390,44 @@ def _dates_by_service_ids(feed: Feed) -> Dict[FrozenSet[str], FrozenSet[datetime
 
 
 def _trip_counts_by_date(feed: Feed) -> Dict[datetime.date, int]:
-    results: DefaultDict[datetime.date, int] = defaultdict(int)
+    services, dates, matrix = _service_matrix(feed)
+    trips_per_service = feed.trips.service_id.value_counts()
+    counts = trips_per_service.reindex(services, fill_value=0).to_numpy() @ matrix
+
+    active = matrix.any(axis=0)
+    return dict(zip(dates[active].astype(object), counts[active].tolist()))
+
+
+def _trip_counts_by_date_and_group(feed: Feed, by: str) -> pd.DataFrame:
     trips = feed.trips
-    for service_ids, dates in _dates_by_service_ids(feed).items():
-        trip_count = trips[trips.service_id.isin(service_ids)].shape[0]
-        for date in dates:
-            results[date] += trip_count
-    return dict(results)
+    if by == "agency_id" and by not in trips.columns:
+        routes = feed.routes
+        agency_ids = routes.agency_id.to_numpy() if by in routes.columns else np.nan
+        agencies = pd.Series(agency_ids, index=routes.route_id, dtype=object)
+        trips = trips.assign(agency_id=trips.route_id.map(agencies))
+    elif by not in trips.columns:
+        raise ValueError("Column not found in trips.txt: {}".format(by))
+
+    services, dates, matrix = _service_matrix(feed)
+
+    # Count trips by group and service_id, then spread over service dates
+    sizes = trips.groupby([by, "service_id"], dropna=False).size()
+    group_idx, groups = pd.factorize(
+        sizes.index.get_level_values(0), use_na_sentinel=False
+    )
+    service_idx = services.get_indexer(sizes.index.get_level_values(1))
+    scheduled = service_idx >= 0
+
+    weights = np.zeros((groups.size, services.size), dtype=np.int64)
+    np.add.at(
+        weights,
+        (group_idx[scheduled], service_idx[scheduled]),
+        sizes.to_numpy()[scheduled],
+    )
+    counts = weights @ matrix
+
+    rows, cols = np.nonzero(counts)
+    df = pd.DataFrame(
+        {"date": dates[cols], by: groups[rows], "trip_count": counts[rows, cols]}
+    )
+    return df.sort_values(["date", by]).reset_index(drop=True)
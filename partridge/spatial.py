@@ -0,0 +1,455 @@
+from abc import ABC, abstractmethod
+from threading import Lock
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+import numpy as np
+import pandas as pd
+
+
+class ShapeArrays(NamedTuple):
+    """The points of each shape in shapes.txt, as arrays
+
+    The points of the shape `shape_ids[i]` are the rows
+    `coords[offsets[i]:offsets[i + 1]]` of (lon, lat) coordinates, in
+    `shape_pt_sequence` order.
+    """
+
+    shape_ids: np.ndarray
+    offsets: np.ndarray
+    coords: np.ndarray
+
+
+def shape_arrays(df: pd.DataFrame) -> ShapeArrays:
+    """Group the points of shapes.txt by shape, sorted by `shape_id`"""
+    if df.empty:
+        return ShapeArrays(
+            np.array([], dtype=object),
+            np.zeros(1, dtype=np.int64),
+            np.empty((0, 2), dtype=np.float64),
+        )
+
+    codes, shape_ids = pd.factorize(df.shape_id, sort=True)
+    sequence = df.shape_pt_sequence.to_numpy(dtype=np.float64)
+    order = np.lexsort((sequence, codes))
+    # Points without a shape_id sort first
+    order = order[codes[order] >= 0]
+
+    offsets = np.zeros(len(shape_ids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(codes[order], minlength=len(shape_ids)), out=offsets[1:])
+
+    coords = np.column_stack(
+        [
+            df.shape_pt_lon.to_numpy(dtype=np.float64)[order],
+            df.shape_pt_lat.to_numpy(dtype=np.float64)[order],
+        ]
+    )
+
+    return ShapeArrays(np.asarray(shape_ids, dtype=object), offsets, coords)
+
+
+# The longitude and latitude columns of files that can be filtered by area
+COORDINATE_COLUMNS = {"stops.txt": ("stop_lon", "stop_lat")}
+
+
+class SpatialFilter(ABC):
+    """A view filter selecting the rows of a file located within an area"""
+
+    @abstractmethod
+    def contains(self, lon: np.ndarray, lat: np.ndarray) -> np.ndarray:
+        """Return a mask of the points within the area"""
+
+
+class BoundingBox(SpatialFilter):
+    """The area between two longitudes and two latitudes, inclusive"""
+
+    def __init__(self, min_lon: float, min_lat: float, max_lon: float, max_lat: float):
+        if min_lon > max_lon or min_lat > max_lat:
+            raise ValueError("Invalid bounding box")
+
+        self.bounds = (float(min_lon), float(min_lat), float(max_lon), float(max_lat))
+
+    def __repr__(self) -> str:
+        return "BoundingBox({}, {}, {}, {})".format(*self.bounds)
+
+    def contains(self, lon: np.ndarray, lat: np.ndarray) -> np.ndarray:
+        min_lon, min_lat, max_lon, max_lat = self.bounds
+        return (lon >= min_lon) & (lon <= max_lon) & (lat >= min_lat) & (lat <= max_lat)
+
+
+class Polygon(SpatialFilter):
+    """The area within a ring of (lon, lat) vertices, excluding the areas
+    within any `interiors` rings
+    """
+
+    def __init__(
+        self,
+        exterior: Sequence[Tuple[float, float]],
+        interiors: Iterable[Sequence[Tuple[float, float]]] = (),
+    ):
+        self.rings = [
+            np.asarray(ring, dtype=np.float64).reshape(-1, 2)
+            for ring in [exterior, *interiors]
+        ]
+        if len(self.rings[0]) < 3:
+            raise ValueError("Polygons need at least 3 vertices")
+
+    @classmethod
+    def from_geo_interface(cls, obj: Any) -> "Polygon":
+        """Convert a (Multi)Polygon with a `__geo_interface__`, such as a
+        shapely geometry, or a GeoJSON-like dict
+        """
+        geometry = getattr(obj, "__geo_interface__", obj)
+        if geometry["type"] == "Polygon":
+            parts = [geometry["coordinates"]]
+        elif geometry["type"] == "MultiPolygon":
+            parts = geometry["coordinates"]
+        else:
+            raise ValueError("Unsupported geometry: {}".format(geometry["type"]))
+
+        # Points are inside if they are within an odd number of rings
+        rings = [ring for part in parts for ring in part]
+        return cls(rings[0], rings[1:])
+
+    def __repr__(self) -> str:
+        exterior, *interiors = [ring.tolist() for ring in self.rings]
+        return "Polygon({}, {})".format(exterior, interiors)
+
+    def contains(self, lon: np.ndarray, lat: np.ndarray) -> np.ndarray:
+        inside = np.zeros(len(lon), dtype=bool)
+
+        # Only test the points within the bounding box of the rings
+        vertices = np.concatenate(self.rings)
+        (min_lon, min_lat), (max_lon, max_lat) = vertices.min(0), vertices.max(0)
+        candidates = np.flatnonzero(
+            BoundingBox(min_lon, min_lat, max_lon, max_lat).contains(lon, lat)
+        )
+        x, y = lon[candidates], lat[candidates]
+
+        # Count the edges crossed by a ray from each point towards +lon
+        crossings = np.zeros(len(candidates), dtype=bool)
+        for ring in self.rings:
+            for (x1, y1), (x2, y2) in zip(ring, np.roll(ring, -1, axis=0)):
+                if y1 == y2:
+                    continue
+                crosses = (y1 > y) != (y2 > y)
+                crosses &= x < x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+                crossings ^= crosses
+
+        inside[candidates] = crossings
+        return inside
+
+
+def filter_columns(filename: str, filters: Dict[str, Any]) -> Set[str]:
+    """Return the columns of a file read by its view filters"""
+    columns: Set[str] = set()
+    for col, values in filters.items():
+        if isinstance(values, SpatialFilter):
+            columns.update(COORDINATE_COLUMNS.get(filename, ()))
+        else:
+            columns.add(col)
+    return columns
+
+
+def select_within(
+    area: SpatialFilter, filename: str, values: Callable[[str], Optional[np.ndarray]]
+) -> Optional[np.ndarray]:
+    """Return a mask of the rows of a file located within an area, or None
+    if the file has no coordinates. `values` returns the raw values of a
+    column, if present.
+    """
+    lon_col, lat_col = COORDINATE_COLUMNS.get(filename, (None, None))
+    lon = None if lon_col is None else values(lon_col)
+    lat = None if lat_col is None else values(lat_col)
+    if lon is None or lat is None:
+        return None
+
+    lon = pd.to_numeric(lon, errors="coerce").astype(np.float64)
+    lat = pd.to_numeric(lat, errors="coerce").astype(np.float64)
+    return area.contains(lon, lat)
+
+
+# Mean radius of the Earth in meters
+EARTH_RADIUS = 6371008.8
+
+DEFAULT_CELL_SIZE = 200.0
+
+# Cells must be wide enough for the position of a cell along each axis of
+# the sphere to fit in 21 bits
+MIN_CELL_SIZE = 10.0
+
+# Queries are answered in batches of this many points, comparing at most
+# about this many pairs of a point and a stop at a time, to bound memory use
+QUERY_BATCH_SIZE = 65536
+MAX_CANDIDATES = 2 ** 20
+
+# Offsets of a grid cell and its 26 neighbors
+_NEIGHBORS = np.array(
+    [(i, j, k) for i in (-1, 0, 1) for j in (-1, 0, 1) for k in (-1, 0, 1)],
+    dtype=np.int64,
+)
+
+
+class StopIndex(object):
+    """A spatial index of stops for nearest stop and radius queries
+
+    Stops are indexed by their position in meters on a sphere, in grids of
+    cubic cells whose size doubles from one level to the next, starting at
+    `cell_size` meters. Each level is built the first time a query needs it.
+    Distances are great-circle distances in meters.
+    """
+
+    def __init__(
+        self,
+        stop_ids: np.ndarray,
+        lon: np.ndarray,
+        lat: np.ndarray,
+        cell_size: float = DEFAULT_CELL_SIZE,
+    ):
+        if cell_size < MIN_CELL_SIZE:
+            raise ValueError("Cell size must be at least {}m".format(MIN_CELL_SIZE))
+
+        lon = np.asarray(lon, dtype=np.float64)
+        lat = np.asarray(lat, dtype=np.float64)
+        located = np.isfinite(lon) & np.isfinite(lat)
+
+        self.stop_ids = np.asarray(stop_ids, dtype=object)[located]
+        self._xyz = _to_xyz(lon[located], lat[located])
+        self._cell_size = cell_size
+        self._grids: Dict[int, Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self.stop_ids)
+
+    def nearest(self, lon: np.ndarray, lat: np.ndarray) -> pd.DataFrame:
+        """Find the nearest stop to each point
+
+        Return the `stop_id` of the nearest stop and its `distance`, in
+        meters, for each point in order. Points without finite coordinates
+        have no nearest stop.
+        """
+        xyz, located = _to_query_xyz(lon, lat)
+        stops = np.full(len(xyz), -1, dtype=np.int64)
+        chords = np.full(len(xyz), np.nan)
+
+        for start in range(0, len(located) if len(self) else 0, QUERY_BATCH_SIZE):
+            batch = located[start : start + QUERY_BATCH_SIZE]
+            stops[batch], chords[batch] = self._nearest(xyz[batch])
+
+        stop_ids = np.full(len(stops), None, dtype=object)
+        stop_ids[stops >= 0] = self.stop_ids[stops[stops >= 0]]
+
+        return pd.DataFrame(
+            {
+                "stop_id": stop_ids,
+                "distance": _arc_length(chords),
+            }
+        )
+
+    def within(self, lon: np.ndarray, lat: np.ndarray, radius: float) -> pd.DataFrame:
+        """Find the stops within `radius` meters of each point
+
+        Return a row for each pair of a point and a nearby stop: the
+        position of the `point`, the `stop_id` and the `distance` in meters.
+        Rows are sorted by point, then by distance. Points without finite
+        coordinates have no stops nearby.
+        """
+        xyz, located = _to_query_xyz(lon, lat)
+        max_chord = _chord_length(radius)
+        level = int(self._level(np.asarray(max_chord)))
+
+        points, stops, chords = [], [], []
+        for start in range(0, len(located) if len(self) else 0, QUERY_BATCH_SIZE):
+            positions = located[start : start + QUERY_BATCH_SIZE]
+            batch = xyz[positions]
+            for queries, candidates in self._iter_candidates(level, batch):
+                dist = _distance(batch, queries, self._xyz, candidates)
+                near = dist <= max_chord
+                points.append(positions[queries[near]])
+                stops.append(candidates[near])
+                chords.append(dist[near])
+
+        point = np.concatenate(points) if points else np.array([], dtype=np.int64)
+        stop = np.concatenate(stops) if stops else np.array([], dtype=np.int64)
+        chord = np.concatenate(chords) if chords else np.array([])
+        order = np.lexsort((chord, point))
+
+        return pd.DataFrame(
+            {
+                "point": point[order],
+                "stop_id": self.stop_ids[stop[order]],
+                "distance": _arc_length(chord[order]),
+            }
+        )
+
+    def _nearest(self, xyz: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Search grids of increasing cell size until every point has a
+        stop closer than the size of a cell, so that no stop outside of the
+        neighboring cells can be closer
+        """
+        stops = np.full(len(xyz), -1, dtype=np.int64)
+        chords = np.full(len(xyz), np.nan)
+        levels = np.zeros(len(xyz), dtype=np.int64)
+        pending = np.arange(len(xyz))
+
+        while len(pending):
+            level = levels[pending].min()
+            current = pending[levels[pending] == level]
+            levels[current] = level + 1
+
+            points_xyz = xyz[current]
+            for queries, candidates in self._iter_candidates(level, points_xyz):
+                dist = _distance(points_xyz, queries, self._xyz, candidates)
+
+                # Candidates are sorted by point, so find the closest of each
+                first = np.flatnonzero(np.diff(queries, prepend=-1))
+                closest = np.minimum.reduceat(dist, first)
+                is_closest = dist == np.repeat(
+                    closest, np.diff(first, append=len(dist))
+                )
+                best = np.flatnonzero(is_closest)
+                best = best[np.diff(queries[best], prepend=-1) != 0]
+                points = current[queries[best]]
+
+                resolved = dist[best] <= self._cell_size * 2 ** level
+                stops[points[resolved]] = candidates[best[resolved]]
+                chords[points[resolved]] = dist[best[resolved]]
+
+                # The nearest stop is no further than the closest one found,
+                # so skip to the level whose cells are at least that wide
+                skip = points[~resolved]
+                levels[skip] = np.maximum(level + 1, self._level(dist[best[~resolved]]))
+
+            pending = pending[stops[pending] < 0]
+
+        return stops, chords
+
+    def _level(self, chord: np.ndarray) -> np.ndarray:
+        """Return the first level whose cells are at least `chord` wide"""
+        ratio = np.maximum(chord, 1e-9) / self._cell_size
+        return np.maximum(0, np.ceil(np.log2(ratio))).astype(np.int64)
+
+    def _iter_candidates(
+        self, level: int, xyz: np.ndarray
+    ) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """Yield pairs of the position of a point and of a stop in the same
+        or a neighboring cell, in chunks of whole points
+        """
+        keys, starts, order = self._grid(level)
+        cells = np.floor(xyz / (self._cell_size * 2 ** level)).astype(np.int64)
+
+        queries, lo, hi = [], [], []
+        for offset in _NEIGHBORS:
+            key = _cell_keys(cells + offset)
+            pos = np.searchsorted(keys, key)
+            hit = pos < len(keys)
+            hit[hit] = keys[pos[hit]] == key[hit]
+            queries.append(np.flatnonzero(hit))
+            lo.append(starts[pos[hit]])
+            hi.append(starts[pos[hit] + 1])
+
+        query = np.concatenate(queries)
+        by_query = np.argsort(query, kind="stable")
+        query = query[by_query]
+        start = np.concatenate(lo)[by_query]
+        counts = np.concatenate(hi)[by_query] - start
+
+        # Split the cells into chunks of about MAX_CANDIDATES stops, without
+        # splitting the cells of a point across chunks
+        totals = np.cumsum(counts)
+        bounds = np.searchsorted(
+            totals,
+            np.arange(MAX_CANDIDATES, totals[-1] if len(totals) else 0, MAX_CANDIDATES),
+        )
+        bounds = np.searchsorted(query, query[bounds])
+        bounds = np.unique(np.concatenate([[0], bounds, [len(query)]]))
+
+        for a, b in zip(bounds[:-1], bounds[1:]):
+            # Expand each (query, start, count) into a pair per stop in the cell
+            n = counts[a:b]
+            shift = np.repeat(start[a:b] - np.cumsum(n) + n, n)
+            yield np.repeat(query[a:b], n), order[shift + np.arange(n.sum())]
+
+    def _grid(self, level: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return the sorted keys of the occupied cells at a level, the
+        position of the first stop of each cell (and of the end), and the
+        positions of the stops sorted by cell
+        """
+        with self._lock:
+            if level not in self._grids:
+                cells = np.floor(self._xyz / (self._cell_size * 2 ** level))
+                keys = _cell_keys(cells.astype(np.int64))
+                order = np.argsort(keys, kind="stable")
+                unique, starts = np.unique(keys[order], return_index=True)
+                starts = np.append(starts, len(keys))
+                self._grids[level] = (unique, starts, order)
+            return self._grids[level]
+
+
+def stop_index(stops: pd.DataFrame, cell_size: float = DEFAULT_CELL_SIZE) -> StopIndex:
+    """Index the stops of a stops.txt table, or of a GeoDataFrame of stops
+    built by `partridge.geo.build_stops`
+    """
+    if "stop_lon" in stops.columns:
+        lon, lat = stops.stop_lon, stops.stop_lat
+    else:
+        lon, lat = stops.geometry.x, stops.geometry.y
+
+    return StopIndex(
+        stops.stop_id.to_numpy(),
+        pd.to_numeric(lon).to_numpy(dtype=np.float64),
+        pd.to_numeric(lat).to_numpy(dtype=np.float64),
+        cell_size=cell_size,
+    )
+
+
+def _to_xyz(lon: np.ndarray, lat: np.ndarray) -> np.ndarray:
+    lon, lat = np.radians(lon), np.radians(lat)
+    return EARTH_RADIUS * np.column_stack(
+        [np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)]
+    )
+
+
+def _to_query_xyz(lon: np.ndarray, lat: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the positions of query points, along with the indexes of the
+    points with finite coordinates, which are the only ones searched
+    """
+    xyz = _to_xyz(np.asarray(lon, dtype=np.float64), np.asarray(lat, dtype=np.float64))
+    return xyz, np.flatnonzero(np.isfinite(xyz).all(axis=1))
+
+
+def _cell_keys(cells: np.ndarray) -> np.ndarray:
+    """Pack the (x, y, z) positions of cells into an integer each"""
+    cells = cells + 2 ** 20
+    return (cells[:, 0] << 42) | (cells[:, 1] << 21) | cells[:, 2]
+
+
+def _distance(a: np.ndarray, i: np.ndarray, b: np.ndarray, j: np.ndarray) -> np.ndarray:
+    """Return the distances between the points `a[i]` and `b[j]`"""
+    total = np.zeros(len(i))
+    for axis in range(3):
+        delta = a[i, axis] - b[j, axis]
+        total += delta * delta
+    return np.sqrt(total)
+
+
+def _chord_length(distance: float) -> float:
+    """Convert a great-circle distance to a straight line distance"""
+    angle = min(distance / EARTH_RADIUS, np.pi)
+    return 2 * EARTH_RADIUS * np.sin(angle / 2)
+
+
+def _arc_length(chord: np.ndarray) -> np.ndarray:
+    """Convert straight line distances to great-circle distances"""
+    return 2 * EARTH_RADIUS * np.arcsin(np.clip(chord / (2 * EARTH_RADIUS), 0, 1))
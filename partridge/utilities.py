@@ -1,7 +1,10 @@
+import io
+from itertools import islice
 from typing import Any, Dict, Iterable, Optional, Set, BinaryIO, Union
 
 from charset_normalizer import detect
 import networkx as nx
+import numpy as np
 import pandas as pd
 from pandas.core.common import flatten
 
@@ -29,30 +32,100 @@ def remove_node_attributes(G: nx.DiGraph, attributes: Union[str, Iterable[str]])
     return G
 
 
+def estimate_memory_usage(df: pd.DataFrame, sample_size: int = 1000) -> int:
+    """
+    Return the approximate number of bytes used by a DataFrame.
+
+    The Python objects in object columns (usually strings) are measured on
+    an evenly spaced sample of at most `sample_size` rows, which is much
+    faster than `df.memory_usage(deep=True)` for large tables.
+    """
+    usage = int(df.memory_usage(deep=False).sum())
+    objects = df.select_dtypes(include="object")
+    if objects.empty:
+        return usage
+
+    sample = objects.iloc[:: max(1, len(objects) // sample_size)]
+    deep = sample.memory_usage(index=False, deep=True).sum()
+    shallow = sample.memory_usage(index=False, deep=False).sum()
+    return usage + int((deep - shallow) * len(objects) / len(sample))
+
+
 def detect_encoding(f: BinaryIO, limit: int = 2500) -> str:
     """
     Return encoding of provided input stream.
 
     Most of the time it's unicode, but if we are unable to decode the input
-    natively, use `chardet` to determine the encoding heuristically.
+    natively, use `charset_normalizer` to determine the encoding heuristically.
+    Only the first `limit` lines are sampled.
     """
-    unicode_decodable = True
+    sample = b"".join(islice(f, limit))
 
-    for line_no, line in enumerate(f):
-        try:
-            line.decode("utf-8")
-        except UnicodeDecodeError:
-            unicode_decodable = False
-            break
+    try:
+        sample.decode("utf-8")
+        return "utf-8"
+    except UnicodeDecodeError:
+        return detect(sample)["encoding"]
 
-        if line_no > limit:
-            break
 
-    if unicode_decodable:
-        return "utf-8"
+def has_edge_whitespace(data: bytes) -> bool:
+    """
+    Return True if UTF-8 encoded CSV data may contain field values with
+    leading or trailing whitespace.
+
+    Spaces and tabs only count next to delimiters, quotes and line breaks.
+    Any other whitespace character (including non-ASCII whitespace) counts
+    wherever it appears, so false positives are possible, but not false
+    negatives.
+    """
+    a = np.frombuffer(data, dtype=np.uint8)
+
+    # Check the neighbors of each space or tab
+    blank = np.flatnonzero((a == ord(" ")) | (a == ord("\t")))
+    neighbors = np.concatenate(
+        [a[blank[blank > 0] - 1], a[blank[blank < a.size - 1] + 1]]
+    )
+    for edge in b',"\r\n':
+        # Bytes adjacent to the start or end of a field
+        if (neighbors == edge).any():
+            return True
+
+    # Vertical tab, form feed and the ASCII separators 0x1c-0x1f
+    control = a[a < 0x20]
+    if ((control == 0x0B) | (control == 0x0C) | (control >= 0x1C)).any():
+        return True
+
+    # Lead bytes of UTF-8 sequences which include unicode whitespace
+    nonascii = a[a >= 0x80]
+    return bool(((nonascii == 0xC2) | ((nonascii >= 0xE1) & (nonascii <= 0xE3))).any())
+
+
+class WhitespaceScanner(io.RawIOBase):
+    """
+    A readable stream which passes through UTF-8 encoded CSV data from
+    another stream, noting whether any field values may need stripping.
+    """
+
+    def __init__(self, raw: BinaryIO):
+        self._raw = raw
+        self._last = b"\n"
+        self.found = False
+
+    def readable(self) -> bool:
+        return True
 
-    f.seek(0)
-    return detect(f.read())["encoding"]
+    def readinto(self, b: Any) -> int:
+        data = self._raw.read(len(b))
+        n = len(data)
+        b[:n] = data
+        if n and not self.found:
+            # Include the previous byte to catch whitespace across reads
+            self.found = has_edge_whitespace(self._last + data)
+            self._last = data[-1:]
+        elif not n and len(b) and self._last in (b" ", b"\t"):
+            # The end of the data also ends a field
+            self.found = True
+        return n
 
 
 def empty_df(columns: Optional[Iterable[str]] = None) -> pd.DataFrame:
@@ -1,57 +1,144 @@
+import io
+from itertools import chain
 import os
 import shutil
 import tempfile
-from multiprocessing.pool import ThreadPool
-from typing import Collection, Optional
+from threading import Lock
+import time
+from typing import IO, Collection, Dict, Iterable, Optional
+import zipfile
 
 import networkx as nx
+import pandas as pd
 
 from .config import default_config
-from .gtfs import Feed
+from .gtfs import Feed, _run_in_dependency_order
 from .readers import load_feed
 from .types import View
 from .utilities import remove_node_attributes
 
 
 DEFAULT_NODES = frozenset(default_config().nodes())
+# Bytes of each file held in memory while it is serialized, beyond which
+# it is spooled to disk
+SPOOL_SIZE = 16 * 2 ** 20
 
 
 def extract_feed(
     inpath: str, outpath: str, view: View, config: nx.DiGraph = None
 ) -> str:
-    """Extract a subset of a GTFS zip into a new file"""
+    """Extract a subset of a GTFS zip into a new file
+
+    Files are streamed into the new zip in chunks, after resolving the
+    identifiers each file is filtered by, so that only the selected rows of
+    a large file such as stop_times.txt are ever held in memory. Values are
+    written as they were read, without type conversions.
+    """
     config = default_config() if config is None else config
     config = remove_node_attributes(config, "converters")
-    feed = load_feed(inpath, view, config)
-    return write_feed_dangerously(feed, outpath)
+    feed = load_feed(inpath, view, config, stream_threshold=0)
+    return write_feed_dangerously(feed, outpath, stream=True)
 
 
 def write_feed_dangerously(
-    feed: Feed, outpath: str, nodes: Optional[Collection[str]] = None
+    feed: Feed,
+    outpath: str,
+    nodes: Optional[Collection[str]] = None,
+    compression: int = zipfile.ZIP_DEFLATED,
+    compresslevel: Optional[int] = None,
+    max_workers: Optional[int] = None,
+    timings: Optional[Dict[str, float]] = None,
+    stream: bool = False,
 ) -> str:
     """Naively write a feed to a zipfile
 
+    Files are read and serialized as CSV by a pool of at most `max_workers`
+    threads, then copied into the zipfile one at a time, compressed with
+    `compression` at `compresslevel`. If a dict is given as `timings`, it
+    is filled with the seconds spent writing each file.
+
+    If `stream` is True, files are written in chunks from
+    `Feed.iter_chunks`, without caching them or applying node
+    transformations. Where the selected rows can be told apart from the
+    lines of the original file, those lines are copied instead, along with
+    the whole file if every row is selected.
+
     This function provides no sanity checks. Use it at
     your own risk.
     """
     nodes = DEFAULT_NODES if nodes is None else nodes
-    with tempfile.TemporaryDirectory() as tmpdir:
+    if not outpath.endswith(".zip"):
+        outpath += ".zip"
 
-        def write_node(node):
-            df = feed.get(node)
-            if not df.empty:
-                path = os.path.join(tmpdir, node)
-                df.to_csv(path, index=False)
+    # Opened outside the try block, so that a zipfile which couldn't be
+    # created isn't removed
+    zf = zipfile.ZipFile(outpath, "w", compression, compresslevel=compresslevel)
+    try:
+        with zf:
+            # Only one member of a zipfile can be written at a time
+            lock = Lock()
 
-        pool = ThreadPool(len(nodes))
-        try:
-            pool.map(write_node, nodes)
-        finally:
-            pool.terminate()
+            def write_node(node):
+                raw = feed._iter_raw(node) if stream else None
+                if raw is not None:
+                    chunks, write = raw, _write_bytes
+                elif stream:
+                    chunks, write = iter(feed.iter_chunks(node)), _write_csv
+                else:
+                    chunks, write = iter([feed.get(node)]), _write_csv
 
-        if outpath.endswith(".zip"):
-            outpath, _ = os.path.splitext(outpath)
+                first = next(chunks, None)
+                if first is None or (isinstance(first, pd.DataFrame) and first.empty):
+                    return
 
-        outpath = shutil.make_archive(outpath, "zip", tmpdir)
+                start = time.perf_counter()
+                # Serialize the file while others are copied into the
+                # zipfile, holding the lock only to copy it in
+                with tempfile.SpooledTemporaryFile(SPOOL_SIZE) as buf:
+                    write(chain([first], chunks), buf)
+                    buf.seek(0)
+                    with lock:
+                        with zf.open(node, "w", force_zip64=True) as member:
+                            shutil.copyfileobj(buf, member, 2 ** 20)
+
+                if timings is not None:
+                    timings[node] = time.perf_counter() - start
+
+            # Files are written after the files they are pruned by, which
+            # are then resolved already
+            _run_in_dependency_order(feed._config, nodes, write_node, max_workers)
+    except BaseException:
+        os.remove(outpath)
+        raise
 
     return outpath
+
+
+def _write_bytes(blocks: Iterable[bytes], f: IO[bytes]) -> None:
+    for block in blocks:
+        f.write(block)
+
+
+class _RawWriter(io.RawIOBase):
+    """A raw binary file passing each write on to another file, which is
+    left open when this one is closed
+    """
+
+    def __init__(self, f: IO[bytes]):
+        self._f = f
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._f.write(b)
+        return len(b)
+
+
+def _write_csv(chunks: Iterable[pd.DataFrame], f: IO[bytes]) -> None:
+    """Write DataFrames with the same columns to a binary file as CSV"""
+    with io.TextIOWrapper(
+        io.BufferedWriter(_RawWriter(f), 2 ** 20), "utf-8", newline=""
+    ) as text:
+        for i, chunk in enumerate(chunks):
+            chunk.to_csv(text, index=False, header=i == 0)
@@ -57,5 +57,5 @@ setup(
     test_suite="tests",
     tests_require=test_requirements,
     setup_requires=setup_requirements,
-    extras_require={"full": ["geopandas"]},
+    extras_require={"full": ["geopandas", "pyarrow", "shapely>=2"]},
 )
@@ -0,0 +1,67 @@
+import os
+import tempfile
+from concurrent.futures.process import BrokenProcessPool
+
+import partridge as ptg
+from partridge.batch import extract_feeds, map_feeds, read_busiest_dates
+
+from .helpers import fixture, zip_file
+
+
+def crash_on_caltrain(path):
+    if "caltrain" in path:
+        os._exit(1)
+    return ptg.read_busiest_date(path)
+
+
+def test_read_busiest_dates():
+    paths = [
+        fixture("caltrain-2017-07-24"),
+        zip_file("seattle-area-2017-11-16"),
+        fixture("missing"),
+    ]
+
+    results = {r.path: r for r in read_busiest_dates(paths, max_workers=2)}
+
+    assert set(results) == set(paths)
+    for path in paths[:2]:
+        assert results[path].error is None
+        assert results[path].value == ptg.read_busiest_date(path)
+
+    missing = results[fixture("missing")]
+    assert missing.value is None
+    assert isinstance(missing.error, ValueError)
+
+
+def test_map_feeds_isolates_dead_workers():
+    paths = [
+        fixture("amazon-2017-08-06"),
+        fixture("caltrain-2017-07-24"),
+        fixture("seattle-area-2017-11-16"),
+    ]
+
+    results = {r.path: r for r in map_feeds(crash_on_caltrain, paths, max_workers=1)}
+
+    assert isinstance(results[paths[1]].error, BrokenProcessPool)
+    for path in (paths[0], paths[2]):
+        assert results[path].error is None
+        assert results[path].value == ptg.read_busiest_date(path)
+
+
+def test_extract_feeds():
+    paths = [fixture("caltrain-2017-07-24"), zip_file("seattle-area-2017-11-16")]
+    view = {"trips.txt": {"direction_id": "0"}}
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        results = list(extract_feeds(paths, tmpdir, view, max_workers=2))
+
+        assert all(r.error is None for r in results)
+        assert sorted(os.path.basename(r.value) for r in results) == [
+            "caltrain-2017-07-24.zip",
+            "seattle-area-2017-11-16.zip",
+        ]
+        for result in results:
+            expected = ptg.load_feed(result.path, view)
+            actual = ptg.load_feed(result.value)
+            assert actual.trips.shape == expected.trips.shape
+            assert actual.stop_times.shape == expected.stop_times.shape
@@ -0,0 +1,97 @@
+import glob
+import os
+import tempfile
+
+import pytest
+
+import partridge as ptg
+from partridge.gtfs import Feed
+
+from .helpers import fixture, zip_file
+
+pytest.importorskip("pyarrow")
+
+from partridge.cache import clear_cache, fingerprint  # noqa: E402
+
+
+def cached_tables(cache_dir):
+    return glob.glob(os.path.join(cache_dir, "*", "*", "*.arrow"))
+
+
+@pytest.mark.parametrize(
+    "path", [zip_file("amazon-2017-08-06"), fixture("amazon-2017-08-06")]
+)
+def test_load_feed_with_cache(path, monkeypatch):
+    view = {"trips.txt": {"service_id": "1"}}
+    expected = ptg.load_feed(path, view)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        feed = ptg.load_feed(path, view, cache_dir=cache_dir)
+        assert feed.stop_times.equals(expected.stop_times)
+
+        # Dependencies are resolved without being materialized
+        assert len(cached_tables(cache_dir)) == 1
+
+        def fail(*args, **kwargs):
+            raise AssertionError("Cached tables should not be read again")
+
+        monkeypatch.setattr(Feed, "_read_csv", fail)
+
+        feed = ptg.load_feed(path, view, cache_dir=cache_dir)
+        assert feed.stop_times.equals(expected.stop_times)
+
+
+def test_cache_is_keyed_by_view():
+    path = fixture("amazon-2017-08-06")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        a = ptg.load_feed(path, {"trips.txt": {"service_id": "0"}}, cache_dir=cache_dir)
+        b = ptg.load_feed(path, {"trips.txt": {"service_id": "1"}}, cache_dir=cache_dir)
+        assert len(a.trips) != len(b.trips)
+        assert len(cached_tables(cache_dir)) == 2
+
+
+def test_fingerprint():
+    config = ptg.config.default_config()
+    view = {"trips.txt": {"service_id": ["1", "0"]}}
+
+    assert fingerprint(view, config) == fingerprint(
+        {"trips.txt": {"service_id": ["0", "1"]}}, ptg.config.default_config()
+    )
+    assert fingerprint(view, config) == fingerprint(view, ptg.config.geo_config())
+    assert fingerprint(view, config) != fingerprint({}, config)
+    assert fingerprint(view, config) != fingerprint(view, ptg.config.empty_config())
+
+
+def test_cache_eviction():
+    path = fixture("amazon-2017-08-06")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        feed = ptg.load_feed(path, cache_dir=cache_dir)
+        feed.trips
+        (trips,) = cached_tables(cache_dir)
+        size = os.path.getsize(trips)
+        os.utime(trips, (0, 0))
+
+        # The least recently used table is evicted to stay under the limit
+        feed = ptg.load_feed(path, cache_dir=cache_dir, cache_max_bytes=size)
+        feed.feed_info
+        assert [os.path.basename(p) for p in cached_tables(cache_dir)] == [
+            "feed_info.txt.arrow"
+        ]
+
+
+def test_clear_cache():
+    path = fixture("amazon-2017-08-06")
+    other = fixture("caltrain-2017-07-24")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        ptg.load_feed(path, cache_dir=cache_dir).trips
+        ptg.load_feed(other, cache_dir=cache_dir).trips
+        assert len(cached_tables(cache_dir)) == 2
+
+        clear_cache(cache_dir, path)
+        assert len(cached_tables(cache_dir)) == 1
+
+        clear_cache(cache_dir)
+        assert len(cached_tables(cache_dir)) == 0
@@ -1,11 +1,16 @@
 import datetime
+import os
+import tempfile
+import zipfile
+
+import pandas as pd
 import pytest
 
 import partridge as ptg
 from partridge.config import default_config, empty_config
 from partridge.gtfs import Feed
 
-from .helpers import fixture, fixtures_dir
+from .helpers import fixture, fixtures_dir, zip_file
 
 
 def test_invalid_source():
@@ -18,6 +23,52 @@ def test_duplicate_files():
         Feed(fixtures_dir)
 
 
+def test_duplicate_files_in_zip():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "dupes.zip")
+        with zipfile.ZipFile(path, "w") as zf:
+            zf.writestr("a/stops.txt", "stop_id\n1\n")
+            zf.writestr("b/stops.txt", "stop_id\n2\n")
+
+        with pytest.raises(ValueError, match=r"More than one"):
+            Feed(path)
+
+
+def test_zip_source_is_read_in_place(monkeypatch):
+    path = zip_file("nested")
+
+    def fail(*args, **kwargs):
+        raise AssertionError("Zip sources must not be unpacked to disk")
+
+    monkeypatch.setattr(tempfile, "mkdtemp", fail)
+
+    feed = ptg.load_feed(path)
+    expected = Feed(fixture("nested"))
+
+    assert feed.stops.equals(expected.stops)
+    assert feed.stop_times.shape == expected.stop_times.shape
+
+
+def test_whitespace_is_stripped():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with open(os.path.join(tmpdir, "stops.txt"), "w") as f:
+            f.write(' stop_id , stop_name\n1, "Main St, North "\n2 ,Elm St\t\n')
+
+        stops = Feed(tmpdir, config=empty_config()).stops
+
+        assert list(stops.columns) == ["stop_id", "stop_name"]
+        assert list(stops.stop_id) == ["1", "2"]
+        assert list(stops.stop_name) == ["Main St, North", "Elm St"]
+
+        # Trailing whitespace at the very end of a file
+        with open(os.path.join(tmpdir, "stops.txt"), "w") as f:
+            f.write("stop_id,stop_name\n1,Main St ")
+
+        stops = Feed(tmpdir, config=empty_config()).stops
+
+        assert list(stops.stop_name) == ["Main St"]
+
+
 def test_bad_edge_config():
     config = default_config()
 
@@ -30,6 +81,72 @@ def test_bad_edge_config():
         feed.stop_times
 
 
+def test_load_all():
+    path = fixture("caltrain-2017-07-24")
+    view = {"trips.txt": {"route_id": "Bu-130"}}
+    expected = Feed(path, view=view)
+
+    feed = Feed(path, view=view)
+    feed.load_all(max_workers=4)
+
+    assert set(feed._cache) == set(default_config().nodes)
+    for filename in feed._cache:
+        assert feed.get(filename).equals(expected.get(filename))
+
+
+def test_load_all_dependencies():
+    feed = Feed(fixture("caltrain-2017-07-24"))
+    feed.load_all(["stops.txt"])
+
+    assert set(feed._cache) == {"stops.txt", "stop_times.txt", "trips.txt"}
+
+
+def test_load_all_error():
+    config = default_config()
+    config.edges["stop_times.txt", "trips.txt"].pop("dependencies")
+
+    feed = Feed(fixture("caltrain-2017-07-24"), config=config)
+
+    with pytest.raises(ValueError, match=r"Edge missing `dependencies` attribute"):
+        feed.load_all()
+
+
+def test_prune_stats():
+    path = fixture("caltrain-2017-07-24")
+    feed = Feed(path, view={"trips.txt": {"route_id": "Bu-130"}})
+
+    stop_times = feed.stop_times
+    stats = feed.prune_stats()
+
+    assert list(stats.columns) == ["layer", "filename", "dependency", "rows", "removed"]
+    ((_, row),) = stats[stats.filename == "stop_times.txt"].iterrows()
+    assert row.dependency == "trips.txt"
+    assert row.removed > 0
+    assert row.rows - row.removed == len(stop_times)
+    assert row.rows == len(Feed(path).stop_times)
+
+
+@pytest.mark.parametrize(
+    "view", [{}, {"trips.txt": {"direction_id": "0"}}, {"stops.txt": {"zone_id": "21"}}]
+)
+@pytest.mark.parametrize("stream_threshold", [None, 1])
+def test_iter_chunks(view, stream_threshold):
+    path = fixture("seattle-area-2017-11-16")
+    expected = ptg.load_feed(path, view).stop_times
+
+    feed = ptg.load_feed(path, view, stream_threshold=stream_threshold)
+    chunks = list(feed.iter_chunks("stop_times.txt", chunksize=1000))
+
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 1000 for chunk in chunks)
+    assert pd.concat(chunks).equals(expected)
+    assert "stop_times.txt" not in feed._cache
+
+    columns = ["stop_id", "departure_time"]
+    chunks = feed.iter_chunks("stop_times.txt", columns=columns)
+    assert pd.concat(chunks).equals(expected[columns])
+
+
 def test_set():
     feed = Feed(fixture("caltrain-2017-07-24"))
     newval = object()
@@ -37,6 +154,70 @@ def test_set():
     assert feed.get("newkey") is newval
 
 
+@pytest.mark.parametrize("stream_threshold", [None, 1])
+def test_evict(stream_threshold):
+    path = fixture("caltrain-2017-07-24")
+    view = {"trips.txt": {"route_id": "Bu-130"}}
+    feed = Feed(path, view=view, stream_threshold=stream_threshold)
+
+    stop_times = feed.stop_times
+    feed.evict("stop_times.txt")
+    assert "stop_times.txt" not in feed._cache
+    assert feed.stop_times.equals(stop_times)
+
+    stops = feed.stops
+    feed.clear()
+    assert feed.memory_usage().empty
+    assert feed.stops.equals(stops)
+    assert feed.stop_times.equals(stop_times)
+
+
+def test_memory_budget():
+    path = fixture("caltrain-2017-07-24")
+
+    feed = Feed(path)
+    feed.routes
+    feed.trips
+    feed.routes
+    usage = feed.memory_usage()
+    assert list(usage.index) == ["trips.txt", "routes.txt"]
+    assert (usage > 0).all()
+
+    feed = Feed(path, memory_budget=int(usage.sum()) - 1)
+    routes = feed.routes
+    feed.trips
+    assert list(feed.memory_usage().index) == ["trips.txt"]
+    assert feed.routes.equals(routes)
+    assert list(feed.memory_usage().index) == ["routes.txt"]
+
+    feed = Feed(path, memory_budget=0)
+    feed.stop_times
+    assert list(feed.memory_usage().index) == ["stop_times.txt"]
+
+
+def test_set_pins_table():
+    path = fixture("caltrain-2017-07-24")
+    feed = Feed(path, memory_budget=0)
+
+    stops = feed.stops.copy()
+    stops["stop_name"] = "edited"
+    feed.set("stops.txt", stops)
+    feed.stop_times
+    feed.trips
+    feed.shapes
+    assert set(feed.memory_usage().index) == {"stops.txt", "shapes.txt"}
+    assert (feed.stops.stop_name == "edited").all()
+
+    feed.clear()
+    assert list(feed.memory_usage().index) == ["stops.txt"]
+    assert (feed.stops.stop_name == "edited").all()
+
+    feed.evict("stops.txt")
+    assert not (feed.stops.stop_name == "edited").any()
+    feed.trips
+    assert list(feed.memory_usage().index) == ["trips.txt"]
+
+
 @pytest.mark.parametrize(
     "path,dates,shapes",
     [
@@ -68,6 +249,20 @@ def test_set():
                 "stops.txt": (50, 12),
             },
         ),
+        (
+            zip_file("nested"),
+            [datetime.date(2017, 8, 6)],
+            {
+                "agency.txt": (1, 6),
+                "calendar.txt": (1, 10),
+                "calendar_dates.txt": (6, 3),
+                "fare_attributes.txt": (4, 6),
+                "fare_rules.txt": (48, 4),
+                "routes.txt": (3, 7),
+                "shapes.txt": (1094, 5),
+                "stops.txt": (50, 12),
+            },
+        ),
         (
             fixture("nested"),
             [datetime.date(2017, 8, 6)],
@@ -225,3 +420,13 @@ def test_filtered_columns(path):
 
     assert set(feed_full.trips.columns) == set(feed_view.trips.columns)
     assert set(feed_full.trips.columns) == set(feed_null.trips.columns)
+
+
+def test_id_domains():
+    domains = ptg.config.id_domains(default_config())
+
+    assert domains["transfers.txt", "from_stop_id"] == "stop_id"
+    assert domains["stop_times.txt", "stop_id"] == "stop_id"
+    assert domains["fare_rules.txt", "origin_id"] == "zone_id"
+    assert domains["trips.txt", "trip_id"] == "trip_id"
+    assert ("stops.txt", "stop_name") not in domains
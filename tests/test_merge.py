@@ -0,0 +1,94 @@
+import pytest
+
+import partridge as ptg
+from partridge.merge import _FeedMerger, merge_feeds
+
+from .helpers import fixture, zip_file
+
+
+def test_merge_feeds():
+    paths = [fixture("caltrain-2017-07-24"), zip_file("seattle-area-2017-11-16")]
+    feed = merge_feeds(paths)
+
+    for filename in ["stops.txt", "stop_times.txt", "trips.txt", "routes.txt"]:
+        expected = [ptg.load_feed(path).get(filename) for path in paths]
+        assert len(feed.get(filename)) == sum(len(df) for df in expected)
+
+    assert set(feed._cache) == {
+        "stops.txt",
+        "stop_times.txt",
+        "trips.txt",
+        "routes.txt",
+    }
+    assert feed.trips.trip_id.is_unique
+    assert feed.trips.trip_id.str.startswith(
+        ("caltrain-2017-07-24:", "seattle-area-2017-11-16:")
+    ).all()
+    assert feed.stop_times.stop_id.isin(feed.stops.stop_id).all()
+    assert len(feed.agency) == 4
+    assert feed.routes.agency_id.isin(feed.agency.agency_id).all()
+
+
+def test_merge_feeds_with_view():
+    paths = [fixture("caltrain-2017-07-24"), fixture("seattle-area-2017-11-16")]
+    view = {"trips.txt": {"route_id": "caltrain-2017-07-24:Bu-129"}}
+    feed = merge_feeds(paths, view)
+    expected = ptg.load_feed(paths[0], {"trips.txt": {"route_id": "Bu-129"}})
+
+    for filename in ["agency.txt", "stops.txt", "stop_times.txt", "shapes.txt"]:
+        assert len(feed.get(filename)) == len(expected.get(filename))
+
+
+def test_merge_feeds_dedupes_stops():
+    path = fixture("caltrain-2017-07-24")
+    expected = ptg.load_feed(path)
+
+    feed = merge_feeds({path: "a:", zip_file("caltrain-2017-07-24"): "b:"})
+    assert len(feed.stops) == len(expected.stops)
+    assert feed.stops.stop_id.str.startswith("a:").all()
+    assert len(feed.stop_times) == 2 * len(expected.stop_times)
+    assert feed.stop_times.stop_id.str.startswith("a:").all()
+
+    feed = merge_feeds(
+        {path: "a:", zip_file("caltrain-2017-07-24"): "b:"}, dedupe_stops=False
+    )
+    assert len(feed.stops) == 2 * len(expected.stops)
+
+
+@pytest.mark.parametrize(
+    "filenames", [("stops.txt", "stop_times.txt"), ("stop_times.txt", "stops.txt")]
+)
+def test_merge_feeds_concatenates_stops_once(monkeypatch, filenames):
+    concat = _FeedMerger._concat
+    calls = []
+
+    def counting_concat(self, filename):
+        calls.append(filename)
+        return concat(self, filename)
+
+    monkeypatch.setattr(_FeedMerger, "_concat", counting_concat)
+    path = fixture("caltrain-2017-07-24")
+    feed = merge_feeds({path: "a:", zip_file("caltrain-2017-07-24"): "b:"})
+    for filename in filenames:
+        feed.get(filename)
+
+    assert calls.count("stops.txt") == 1
+
+
+def test_merge_feeds_with_remapped_ids():
+    path = fixture("caltrain-2017-07-24")
+
+    def namespace(domain, values):
+        return values.str.lower() if domain == "route_id" else values
+
+    feed = merge_feeds({path: namespace})
+    assert list(feed.routes.route_id) == [
+        route_id.lower() for route_id in ptg.load_feed(path).routes.route_id
+    ]
+    assert feed.trips.route_id.isin(feed.routes.route_id).all()
+
+
+def test_merge_feeds_with_the_same_name():
+    paths = [fixture("caltrain-2017-07-24"), zip_file("caltrain-2017-07-24")]
+    with pytest.raises(ValueError, match=r"different file names"):
+        merge_feeds(paths)
@@ -1,5 +1,6 @@
 import datetime
 import numpy as np
+import pandas as pd
 import pytest
 
 from partridge.parsers import parse_time, parse_date, vparse_time, vparse_date
@@ -48,3 +49,57 @@ def test_vparse_time():
     timeints = [0, 901463]
 
     assert np.array_equal(vparse_time(np.array(timestrs)), timeints)
+
+
+def test_vparse_time_with_unusual_input():
+    timestrs = pd.Series([" 1:02:03 ", np.nan, "", "  ", "1:2:3", "1000:00:00"])
+    expected = [3723, np.nan, np.nan, np.nan, 3723, 3600000]
+
+    assert np.array_equal(vparse_time(timestrs), expected, equal_nan=True)
+
+
+def test_vparse_time_with_negative_input():
+    # Malformed negative values are parsed as parse_time does, not as missing
+    timestrs = ["-1:00:00", "0:-1:00", ""]
+    expected = [parse_time(val) for val in timestrs]
+
+    assert np.array_equal(vparse_time(timestrs), expected, equal_nan=True)
+    assert vparse_time(timestrs, as_int=True).tolist() == [-3600, -60, pd.NA]
+
+
+def test_vparse_time_with_invalid_input():
+    with pytest.raises(ValueError, match=r"invalid literal for int()"):
+        vparse_time(["00:00:00", "10:15:00am"])
+
+
+def test_vparse_time_as_int():
+    actual = vparse_time(pd.Series(["01:02:03", np.nan, "25:24:23"]), as_int=True)
+
+    assert actual.dtype == "Int64"
+    assert actual.tolist() == [3723, pd.NA, 91463]
+
+
+def test_vparse_date_with_unusual_input():
+    datestrs = pd.Series([" 20990101 ", np.nan, "", "20000229"])
+    actual = vparse_date(datestrs)
+
+    assert actual.dtype == np.dtype("datetime64[D]")
+    assert np.array_equal(
+        actual,
+        np.array(["2099-01-01", "NaT", "NaT", "2000-02-29"], dtype="datetime64[D]"),
+        equal_nan=True,
+    )
+
+
+def test_vparse_date_with_invalid_input():
+    datestrs = ["20990101", "20991401", "20990101", "20170229", "2099011"]
+
+    with pytest.raises(ValueError, match=r"in 3 rows: 1: '20991401', 3: '20170229'"):
+        vparse_date(datestrs)
+
+
+def test_vparse_date_as_date():
+    datestrs = ["20990101", np.nan]
+    actual = vparse_date(datestrs, as_date=True)
+
+    assert actual.tolist() == [datetime.date(2099, 1, 1), None]
@@ -1,9 +1,15 @@
 import datetime
+import os
+import shutil
+import tempfile
 
 import numpy as np
+import pandas as pd
 import partridge as ptg
 import pytest
 
+from partridge.gtfs import Feed
+
 from .helpers import fixture, zip_file
 
 
@@ -22,8 +28,8 @@ def test_load_geo_feed():
     assert isinstance(feed.stops, gpd.GeoDataFrame)
     assert {"LineString"} == set(feed.shapes.geom_type)
     assert {"Point"} == set(feed.stops.geom_type)
-    assert feed.shapes.crs == {"init": "EPSG:4326"}
-    assert feed.stops.crs == {"init": "EPSG:4326"}
+    assert feed.shapes.crs == "EPSG:4326"
+    assert feed.stops.crs == "EPSG:4326"
     assert ["shape_id", "geometry"] == list(feed.shapes.columns)
     assert [
         "stop_id",
@@ -158,3 +164,207 @@ def test_busiest_week(path):
         datetime.date(2017, 8, 4): frozenset({"0", "1"}),
         datetime.date(2017, 8, 5): frozenset({"1"}),
     }
+
+
+def test_not_a_zip():
+    with tempfile.NamedTemporaryFile(suffix=".zip") as f:
+        f.write(b"not a zip")
+        f.flush()
+        with pytest.raises(ValueError, match=r"File is not a supported archive"):
+            ptg.load_feed(f.name)
+
+
+def test_load_tarball():
+    path = fixture("caltrain-2017-07-24")
+    view = {"trips.txt": {"route_id": "Bu-130"}}
+    expected = ptg.load_feed(path, view)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tarball = shutil.make_archive(os.path.join(tmpdir, "feed"), "gztar", path)
+        feed = ptg.load_feed(tarball, view)
+
+        assert feed.trips.equals(expected.trips)
+        assert feed.stop_times.equals(expected.stop_times)
+
+
+def test_service_ids_by_date_exceptions():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        files = {
+            "trips.txt": "route_id,service_id,trip_id\nr,wkdy,1\nr,sat,2\nr,xtra,3\n",
+            "calendar.txt": (
+                "service_id,monday,tuesday,wednesday,thursday,friday,saturday,"
+                "sunday,start_date,end_date\n"
+                "wkdy,1,1,1,1,1,0,0,20180101,20180107\n"
+                "sat,0,0,0,0,0,1,0,20180101,20180107\n"
+                "unused,1,1,1,1,1,1,1,20180101,20180107\n"
+            ),
+            "calendar_dates.txt": (
+                "service_id,date,exception_type\n"
+                "wkdy,20180101,2\n"
+                "sat,20180101,1\n"
+                "xtra,20180110,1\n"
+                "xtra,20180110,2\n"
+                "xtra,20180111,1\n"
+            ),
+        }
+        for filename, contents in files.items():
+            with open(os.path.join(tmpdir, filename), "w") as f:
+                f.write(contents)
+
+        assert ptg.read_service_ids_by_date(tmpdir) == {
+            datetime.date(2018, 1, 1): frozenset({"sat"}),
+            datetime.date(2018, 1, 2): frozenset({"wkdy"}),
+            datetime.date(2018, 1, 3): frozenset({"wkdy"}),
+            datetime.date(2018, 1, 4): frozenset({"wkdy"}),
+            datetime.date(2018, 1, 5): frozenset({"wkdy"}),
+            datetime.date(2018, 1, 6): frozenset({"sat"}),
+            datetime.date(2018, 1, 11): frozenset({"xtra"}),
+        }
+
+
+@pytest.mark.parametrize("by", ["route_id", "agency_id"])
+@pytest.mark.parametrize(
+    "path", [fixture("seattle-area-2017-11-16"), fixture("amazon-2017-08-06")]
+)
+def test_trip_counts_by_date_and_route(path, by):
+    counts = ptg.read_trip_counts_by_date_and_route(path, by=by)
+    trip_counts_by_date = ptg.read_trip_counts_by_date(path)
+
+    assert list(counts.columns) == ["date", by, "trip_count"]
+    assert (counts.trip_count > 0).all()
+    assert counts[by].notna().all()
+
+    totals = counts.groupby("date").trip_count.sum()
+    assert {k.date(): v for k, v in totals.items()} == trip_counts_by_date
+
+
+def test_trip_counts_by_date_and_route_bad_column():
+    with pytest.raises(ValueError, match=r"Column not found in trips.txt"):
+        ptg.read_trip_counts_by_date_and_route(fixture("amazon-2017-08-06"), by="nope")
+
+
+@pytest.mark.parametrize(
+    "path", [zip_file("seattle-area-2017-11-16"), fixture("seattle-area-2017-11-16")]
+)
+def test_load_feed_with_columns(path):
+    view = {"stop_times.txt": {"stop_sequence": "1"}}
+    columns = {"stop_times.txt": ["departure_time"], "trips.txt": []}
+
+    full = ptg.load_feed(path, view)
+    feed = ptg.load_feed(path, view, columns=columns)
+
+    # Columns used for pruning and filtering are kept
+    assert set(feed.stop_times.columns) == {
+        "trip_id",
+        "stop_id",
+        "stop_sequence",
+        "departure_time",
+    }
+    assert set(feed.trips.columns) == {"route_id", "service_id", "trip_id", "shape_id"}
+    assert set(feed.stops.columns) == set(full.stops.columns)
+
+    assert feed.stop_times.shape[0] == full.stop_times.shape[0]
+    assert feed.trips.equals(full.trips[feed.trips.columns])
+    assert feed.stops.equals(full.stops)
+
+
+def test_load_feed_with_columns_for_missing_file():
+    feed = ptg.load_feed(
+        fixture("amazon-2017-08-06"), columns={"transfers.txt": ["transfer_type"]}
+    )
+    assert feed.transfers.empty
+    assert set(feed.transfers.columns) == {
+        "from_stop_id",
+        "to_stop_id",
+        "transfer_type",
+    }
+
+
+def test_load_feed_with_categorical_ids():
+    path = fixture("seattle-area-2017-11-16")
+    view = {"routes.txt": {"route_id": ["100232", "100235"]}}
+
+    expected = ptg.load_feed(path, view)
+    feed = ptg.load_feed(path, view, categorical_ids=True)
+
+    trips = feed.trips
+    stop_times = feed.stop_times
+    stops = feed.stops
+
+    assert len(stop_times) and len(stop_times) < len(ptg.load_feed(path).stop_times)
+    assert isinstance(stop_times.trip_id.dtype, pd.CategoricalDtype)
+    assert stop_times.stop_id.dtype == stops.stop_id.dtype
+    assert stop_times.trip_id.dtype == trips.trip_id.dtype
+    assert feed.routes.route_id.dtype == trips.route_id.dtype
+    assert stop_times.stop_headsign.dtype == object
+
+    for df, expected_df in [(trips, expected.trips), (stop_times, expected.stop_times)]:
+        assert df.astype(expected_df.dtypes.to_dict()).equals(expected_df)
+
+
+def test_load_feed_with_categorical_ids_and_set():
+    path = fixture("caltrain-2017-07-24")
+    feed = ptg.load_feed(path, categorical_ids=True)
+
+    routes = ptg.load_feed(path).routes
+    feed.set("routes.txt", routes)
+    stops = feed.stops
+    dtype = stops.stop_id.dtype
+
+    assert len(feed.trips)
+    assert feed.routes.route_id.dtype == object
+    assert stops.stop_id.dtype == dtype
+    assert feed.stop_times.stop_id.dtype == feed.stops.stop_id.dtype
+
+
+def test_load_feed_with_prefetch():
+    path = fixture("amazon-2017-08-06")
+
+    feed = ptg.load_feed(path, prefetch=["shapes.txt"])
+    assert set(feed._cache) == {"shapes.txt", "trips.txt"}
+
+    feed = ptg.load_feed(path, prefetch=True)
+    assert set(feed._cache) == set(ptg.config.default_config().nodes)
+
+
+def test_load_feed_reads_each_file_once(monkeypatch):
+    path = fixture("seattle-area-2017-11-16")
+    view = {"routes.txt": {"agency_id": "ST"}, "stops.txt": {"zone_id": "21"}}
+
+    reads = []
+    read_csv = Feed._read_csv
+
+    def counting_read_csv(self, filename):
+        reads.append(filename)
+        return read_csv(self, filename)
+
+    monkeypatch.setattr(Feed, "_read_csv", counting_read_csv)
+
+    feed = ptg.load_feed(path, view)
+    stop_times = feed.stop_times
+    stops = feed.stops
+    routes = feed.routes
+
+    assert len(stop_times) and sorted(reads) == sorted(set(reads))
+    assert set(stops.zone_id) == {"21"}
+    assert set(stop_times.stop_id) <= set(stops.stop_id)
+    assert set(routes.agency_id) == {"ST"}
+    assert set(feed.trips.route_id) <= set(routes.route_id)
+
+
+@pytest.mark.parametrize(
+    "view",
+    [
+        {},
+        {"trips.txt": {"direction_id": "0"}},
+        {"stops.txt": {"zone_id": "21"}, "routes.txt": {"agency_id": "ST"}},
+    ],
+)
+def test_load_feed_in_chunks(view):
+    path = zip_file("seattle-area-2017-11-16")
+
+    expected = ptg.load_feed(path, view)
+    feed = ptg.load_feed(path, view, chunksize=1000, stream_threshold=1)
+
+    for filename in ptg.config.default_config().nodes:
+        assert feed.get(filename).equals(expected.get(filename)), filename
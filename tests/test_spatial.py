@@ -0,0 +1,344 @@
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import partridge as ptg
+from partridge.spatial import (
+    BoundingBox,
+    Polygon,
+    SpatialFilter,
+    StopIndex,
+    shape_arrays,
+)
+
+from .helpers import fixture
+
+
+SHAPES = pd.DataFrame(
+    {
+        "shape_id": ["b", "a", "b", "a", "a"],
+        "shape_pt_lat": [1.0, 2.0, 3.0, 4.0, 5.0],
+        "shape_pt_lon": [-1.0, -2.0, -3.0, -4.0, -5.0],
+        "shape_pt_sequence": [10, 3, 2, 1, 20],
+    }
+)
+
+
+def test_shape_arrays():
+    shape_ids, offsets, coords = shape_arrays(SHAPES)
+
+    assert list(shape_ids) == ["a", "b"]
+    assert list(offsets) == [0, 3, 5]
+    assert coords.tolist() == [
+        [-4.0, 4.0],
+        [-2.0, 2.0],
+        [-5.0, 5.0],
+        [-3.0, 3.0],
+        [-1.0, 1.0],
+    ]
+
+
+def test_shape_arrays_empty():
+    feed = ptg.load_feed(fixture("empty"))
+    shape_ids, offsets, coords = shape_arrays(feed.shapes)
+
+    assert len(shape_ids) == 0
+    assert list(offsets) == [0]
+    assert coords.shape == (0, 2)
+
+
+def test_build_shapes():
+    pytest.importorskip("geopandas")
+    from partridge.geo import build_shapes
+
+    shapes = build_shapes(SHAPES)
+
+    assert list(shapes.shape_id) == ["a", "b"]
+    assert [list(line.coords) for line in shapes.geometry] == [
+        [(-4.0, 4.0), (-2.0, 2.0), (-5.0, 5.0)],
+        [(-3.0, 3.0), (-1.0, 1.0)],
+    ]
+
+
+def test_build_shapes_matches_arrays():
+    pytest.importorskip("geopandas")
+
+    path = fixture("seattle-area-2017-11-16")
+    shapes = ptg.load_geo_feed(path).shapes
+    shape_ids, offsets, coords = shape_arrays(ptg.load_feed(path).shapes)
+
+    assert list(shapes.shape_id) == list(shape_ids)
+    for i, line in enumerate(shapes.geometry):
+        assert np.array_equal(line.coords, coords[offsets[i] : offsets[i + 1]])
+
+
+def test_build_shapes_simplify():
+    pytest.importorskip("geopandas")
+    from partridge.geo import build_shapes
+
+    # Points 1e-5 degrees (~1.1m) of latitude off a line along the equator
+    df = pd.DataFrame(
+        {
+            "shape_id": "a",
+            "shape_pt_lat": [0.0, 1e-5, 0.0, -1e-5, 0.0],
+            "shape_pt_lon": [0.0, 0.001, 0.002, 0.003, 0.004],
+            "shape_pt_sequence": range(5),
+        }
+    )
+
+    shapes = build_shapes(df, simplify=2)
+    assert list(shapes.geometry[0].coords) == [(0.0, 0.0), (0.004, 0.0)]
+    assert shapes.attrs["point_count"] == {"original": 5, "simplified": 2}
+
+    shapes = build_shapes(df, simplify=1)
+    assert np.allclose(
+        shapes.geometry[0].coords,
+        [(0.0, 0.0), (0.001, 1e-5), (0.003, -1e-5), (0.004, 0.0)],
+    )
+
+    shapes = build_shapes(df, decimals=3)
+    assert list(shapes.geometry[0].coords) == [
+        (0.0, 0.0),
+        (0.001, 0.0),
+        (0.002, 0.0),
+        (0.003, 0.0),
+        (0.004, 0.0),
+    ]
+
+    shapes = build_shapes(df, decimals=2)
+    assert list(shapes.geometry[0].coords) == [(0.0, 0.0), (0.0, 0.0)]
+    assert shapes.attrs["point_count"] == {"original": 5, "simplified": 2}
+
+
+def test_geo_config_simplify():
+    pytest.importorskip("geopandas")
+
+    path = fixture("seattle-area-2017-11-16")
+    config = ptg.config.geo_config(simplify=10, decimals=5)
+    shapes = ptg.load_feed(path, config=config).shapes
+    full = ptg.load_geo_feed(path).shapes
+
+    assert list(shapes.shape_id) == list(full.shape_id)
+    assert shapes.attrs["point_count"]["original"] == len(ptg.load_feed(path).shapes)
+    assert shapes.attrs["point_count"]["simplified"] < len(ptg.load_feed(path).shapes)
+    assert (shapes.geometry.geom_type == "LineString").all()
+    assert (shapes.geometry.hausdorff_distance(full.geometry) < 0.001).all()
+
+
+def test_build_stops():
+    pytest.importorskip("geopandas")
+    from partridge.geo import build_stops
+
+    stops = ptg.load_feed(fixture("caltrain-2017-07-24")).stops
+    columns = list(stops.columns)
+    gdf = build_stops(stops)
+
+    assert list(stops.columns) == columns
+    assert list(gdf.columns) == [
+        col for col in columns if col not in ("stop_lon", "stop_lat")
+    ] + ["geometry"]
+    assert list(gdf.geometry.x) == list(stops.stop_lon)
+    assert list(gdf.geometry.y) == list(stops.stop_lat)
+    assert np.shares_memory(gdf.stop_id.to_numpy(), stops.stop_id.to_numpy())
+
+
+def haversine(lon, lat, stops):
+    lon, lat = np.radians(lon)[:, None], np.radians(lat)[:, None]
+    stop_lon = np.radians(stops.stop_lon.to_numpy(dtype=float))[None, :]
+    stop_lat = np.radians(stops.stop_lat.to_numpy(dtype=float))[None, :]
+    a = (
+        np.sin((stop_lat - lat) / 2) ** 2
+        + np.cos(lat) * np.cos(stop_lat) * np.sin((stop_lon - lon) / 2) ** 2
+    )
+    return 2 * 6371008.8 * np.arcsin(np.sqrt(a))
+
+
+def test_stop_index():
+    feed = ptg.load_feed(fixture("seattle-area-2017-11-16"))
+    stops = feed.stops
+    index = feed.stop_index()
+
+    rng = np.random.default_rng(0)
+    lon = rng.uniform(-122.5, -121.9, 1000)
+    lat = rng.uniform(47.3, 47.9, 1000)
+    distances = haversine(lon, lat, stops)
+
+    nearest = index.nearest(lon, lat)
+    assert list(nearest.stop_id) == list(stops.stop_id[distances.argmin(axis=1)])
+    assert np.allclose(nearest.distance, distances.min(axis=1))
+
+    within = index.within(lon, lat, 1000)
+    points, positions = np.nonzero(distances <= 1000)
+    order = np.lexsort((distances[points, positions], points))
+    assert list(within.point) == list(points[order])
+    assert list(within.stop_id) == list(stops.stop_id[positions[order]])
+    assert np.allclose(within.distance, distances[points, positions][order])
+
+
+def test_feed_stop_index():
+    feed = ptg.load_feed(fixture("caltrain-2017-07-24"))
+
+    index = feed.stop_index()
+    assert feed.stop_index() is index
+    assert len(index) == len(feed.stops)
+
+    feed.evict("stops.txt")
+    assert feed.stop_index() is not index
+
+    # Points 1km west of a stop, and far away from every stop
+    stop = feed.stops.iloc[0]
+    lon = stop.stop_lon - 1000 / (111195 * np.cos(np.radians(stop.stop_lat)))
+    nearest = feed.stop_index().nearest([lon, 0.0], [stop.stop_lat, 0.0])
+    assert nearest.stop_id[0] == stop.stop_id
+    assert nearest.distance[0] == pytest.approx(1000, rel=1e-3)
+    assert nearest.distance[1] > 1e6
+
+    within = feed.stop_index().within([lon, 0.0], [stop.stop_lat, 0.0], 1001)
+    assert stop.stop_id in set(within.stop_id)
+    assert set(within.point) == {0}
+    assert within.distance.is_monotonic_increasing
+
+
+def test_stop_index_empty():
+    feed = ptg.load_feed(fixture("empty"))
+    index = feed.stop_index()
+
+    assert len(index) == 0
+    assert list(index.nearest([0.0], [0.0]).stop_id) == [None]
+    assert index.within([0.0], [0.0], 1000).empty
+
+    with pytest.raises(ValueError, match="Cell size"):
+        StopIndex(np.array([]), np.array([]), np.array([]), cell_size=1)
+
+
+def test_stop_index_missing_coordinates():
+    index = StopIndex(["a", "b", "c"], [-122.0, -122.1, np.nan], [37.0, 37.1, 37.0])
+    lon = [-122.02, np.nan, np.inf, -122.1]
+    lat = [37.02, np.nan, 37.0, 37.1]
+
+    assert len(index) == 2
+
+    nearest = index.nearest(lon, lat)
+    assert list(nearest.stop_id) == ["a", None, None, "b"]
+    assert list(nearest.distance.isna()) == [False, True, True, False]
+
+    within = index.within(lon, lat, 10000)
+    assert list(within.point) == [0, 3]
+    assert list(within.stop_id) == ["a", "b"]
+
+
+def test_geo_feed_stop_index():
+    pytest.importorskip("geopandas")
+
+    path = fixture("amazon-2017-08-06")
+    lon, lat = [-122.3, -122.4], [47.6, 47.65]
+    expected = ptg.load_feed(path).stop_index().nearest(lon, lat)
+
+    actual = ptg.load_geo_feed(path).stop_index().nearest(lon, lat)
+    pd.testing.assert_frame_equal(actual, expected)
+
+
+def test_polygon_contains():
+    square = [(0, 0), (4, 0), (4, 4), (0, 4)]
+    hole = [(1, 1), (3, 1), (3, 3), (1, 3)]
+    lon = np.array([0.5, 2.0, 3.5, 5.0, np.nan])
+    lat = np.array([0.5, 2.0, 3.5, 2.0, 2.0])
+
+    assert list(Polygon(square).contains(lon, lat)) == [True, True, True, False, False]
+    assert list(Polygon(square, [hole]).contains(lon, lat)) == [
+        True,
+        False,
+        True,
+        False,
+        False,
+    ]
+
+    with pytest.raises(ValueError, match="vertices"):
+        Polygon([(0, 0), (1, 1)])
+
+
+def test_polygon_from_geo_interface():
+    geometry = {
+        "type": "MultiPolygon",
+        "coordinates": [
+            [[(0, 0), (1, 0), (1, 1), (0, 1), (0, 0)]],
+            [[(2, 0), (3, 0), (3, 1), (2, 1), (2, 0)]],
+        ],
+    }
+    polygon = Polygon.from_geo_interface(geometry)
+    lon = np.array([0.5, 1.5, 2.5])
+    lat = np.array([0.5, 0.5, 0.5])
+
+    assert list(polygon.contains(lon, lat)) == [True, False, True]
+
+    with pytest.raises(ValueError, match="Unsupported"):
+        Polygon.from_geo_interface({"type": "Point", "coordinates": (0, 0)})
+
+
+def test_spatial_filter_is_abstract():
+    class Incomplete(SpatialFilter):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+@pytest.mark.parametrize("stream_threshold", [None, 0])
+def test_spatial_view(stream_threshold):
+    path = fixture("seattle-area-2017-11-16")
+    area = BoundingBox(-122.35, 47.6, -122.3, 47.65)
+
+    stops = ptg.load_feed(path).stops
+    located = area.contains(stops.stop_lon.to_numpy(), stops.stop_lat.to_numpy())
+    stop_ids = list(stops.stop_id[located])
+    assert 0 < len(stop_ids) < len(stops)
+
+    feed = ptg.load_feed(
+        path, {"stops.txt": {"geometry": area}}, stream_threshold=stream_threshold
+    )
+    expected = ptg.load_feed(path, {"stops.txt": {"stop_id": stop_ids}})
+
+    assert list(feed.stops.stop_id) == stop_ids
+    for filename in ["stop_times.txt", "trips.txt", "routes.txt", "shapes.txt"]:
+        pd.testing.assert_frame_equal(feed.get(filename), expected.get(filename))
+    assert len(feed.stop_times) < len(ptg.load_feed(path).stop_times)
+
+
+def test_spatial_view_polygon():
+    path = fixture("seattle-area-2017-11-16")
+    box = BoundingBox(-122.35, 47.6, -122.3, 47.65)
+    polygon = Polygon(
+        [(-122.35, 47.6), (-122.3, 47.6), (-122.3, 47.65), (-122.35, 47.65)]
+    )
+
+    feed = ptg.load_feed(
+        path, {"stops.txt": {"geometry": polygon}}, columns={"stops.txt": "stop_id"}
+    )
+    expected = ptg.load_feed(path, {"stops.txt": {"geometry": box}})
+
+    assert list(feed.stops.stop_id) == list(expected.stops.stop_id)
+    assert list(feed.trips.trip_id) == list(expected.trips.trip_id)
+
+
+def test_spatial_view_cache():
+    pytest.importorskip("pyarrow")
+
+    path = fixture("seattle-area-2017-11-16")
+    small = BoundingBox(-122.35, 47.6, -122.3, 47.65)
+    large = BoundingBox(-122.5, 47.4, -122.0, 47.8)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        a = ptg.load_feed(path, {"stops.txt": {"geometry": small}}, cache_dir=cache_dir)
+        b = ptg.load_feed(path, {"stops.txt": {"geometry": large}}, cache_dir=cache_dir)
+        assert len(a.stops) < len(b.stops)
+
+
+def test_spatial_view_invalid():
+    area = BoundingBox(-122.35, 47.6, -122.3, 47.65)
+    with pytest.raises(ValueError, match="by location"):
+        ptg.load_feed(fixture("amazon-2017-08-06"), {"trips.txt": {"geometry": area}})
+
+    with pytest.raises(ValueError, match="Invalid bounding box"):
+        BoundingBox(1, 0, 0, 1)
@@ -4,8 +4,10 @@ import pytest
 
 import pandas as pd
 from partridge.utilities import (
+    WhitespaceScanner,
     detect_encoding,
     empty_df,
+    has_edge_whitespace,
     remove_node_attributes,
     setwrap,
 )
@@ -63,3 +65,34 @@ def test_detect_encoding():
     # https://github.com/remix/partridge/pull/84)
     enc = detect_encoding(io.BytesIO(b"\xC4pple"))
     assert enc and enc != "utf-8"
+
+
+def test_has_edge_whitespace():
+    assert not has_edge_whitespace(b"stop_id,stop_name\n1,Main St\n")
+    assert not has_edge_whitespace("1,Café\n".encode("utf-8"))
+    assert has_edge_whitespace(b"1 ,Main St\n")
+    assert has_edge_whitespace(b"1, Main St\n")
+    assert has_edge_whitespace(b"1,Main St\t\r\n")
+    assert has_edge_whitespace(b'1,"Main St "\n')
+    assert has_edge_whitespace("1,Main St \n".encode("utf-8"))
+
+
+def test_whitespace_scanner():
+    data = b"a,b\n" + b"1,2\n" * 100000 + b"3,4 \n"
+    scanner = WhitespaceScanner(io.BytesIO(data))
+
+    assert io.BufferedReader(scanner).read() == data
+    assert scanner.found
+
+
+@pytest.mark.parametrize("end", [b" ", b"\t"])
+def test_whitespace_scanner_without_final_newline(end):
+    data = b"a,b\n1,2" + end
+    scanner = WhitespaceScanner(io.BytesIO(data))
+
+    assert io.BufferedReader(scanner).read() == data
+    assert scanner.found
+
+    scanner = WhitespaceScanner(io.BytesIO(b"a,b\n1,2"))
+    assert io.BufferedReader(scanner).read() == b"a,b\n1,2"
+    assert not scanner.found
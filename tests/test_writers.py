@@ -1,8 +1,12 @@
 import os
 import tempfile
+import zipfile
 
 import partridge as ptg
 import pytest
+from partridge.gtfs import Feed
+from partridge.spatial import BoundingBox
+from partridge.writers import write_feed_dangerously
 
 from .helpers import fixture, zip_file
 
@@ -103,3 +107,168 @@ def test_extract_routes(path):
             original_df = fd.get(node)
             new_df = new_fd.get(node)
             assert set(original_df.columns) == set(new_df.columns)
+
+
+@pytest.mark.parametrize(
+    "compression,compresslevel",
+    [
+        (zipfile.ZIP_DEFLATED, None),
+        (zipfile.ZIP_DEFLATED, 1),
+        (zipfile.ZIP_STORED, None),
+    ],
+)
+def test_write_feed_dangerously(compression, compresslevel):
+    path = fixture("caltrain-2017-07-24")
+    feed = ptg.load_raw_feed(path)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        timings = {}
+        result = write_feed_dangerously(
+            feed,
+            os.path.join(tmpdir, "test"),
+            compression=compression,
+            compresslevel=compresslevel,
+            max_workers=2,
+            timings=timings,
+        )
+        assert result == os.path.join(tmpdir, "test.zip")
+
+        with zipfile.ZipFile(result) as zf:
+            names = set(zf.namelist())
+            assert {info.compress_type for info in zf.infolist()} == {compression}
+            with open(os.path.join(path, "stops.txt"), "rb") as f:
+                assert (
+                    zf.read("stops.txt").splitlines()[1:] == f.read().splitlines()[1:]
+                )
+
+        assert set(timings) == names
+        assert all(seconds >= 0 for seconds in timings.values())
+
+        new_feed = ptg.load_raw_feed(result)
+        for name in names:
+            assert new_feed.get(name).equals(feed.get(name))
+
+
+def test_extract_feed_to_missing_directory():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        outpath = os.path.join(tmpdir, "missing", "out.zip")
+        with pytest.raises(FileNotFoundError) as excinfo:
+            ptg.extract_feed(fixture("caltrain-2017-07-24"), outpath, {})
+
+        # The original error isn't buried under one from cleaning up
+        assert excinfo.value.__context__ is None
+
+
+def test_extract_feed_keeps_values(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        files = {
+            "trips.txt": "route_id,service_id,trip_id\nr1,s1,t1\nr1,s1,t2\n",
+            "stop_times.txt": (
+                "trip_id,arrival_time,departure_time,stop_id,stop_sequence\n"
+                "t1,7:05:00,07:05:00,0010,01\n"
+                "t1,25:00:00,25:00:00,0020,2.0\n"
+                "t2,7:05:00,07:05:00,0020,1\n"
+            ),
+            "stops.txt": (
+                "stop_id,stop_name,stop_lat,stop_lon\n"
+                '0010,"Main St, North",37.7700,-122.40\n'
+                "0020,Elm St,37.1,-122.0\n"
+                "0030,Oak St,37.2,-122.1\n"
+            ),
+        }
+        inpath = os.path.join(tmpdir, "in")
+        os.mkdir(inpath)
+        for name, text in files.items():
+            with open(os.path.join(inpath, name), "w") as f:
+                f.write(text)
+
+        reads = []
+        read_csv_chunks = Feed._read_csv_chunks
+
+        def counting_read_csv_chunks(self, filename, *args):
+            reads.append(filename)
+            return read_csv_chunks(self, filename, *args)
+
+        monkeypatch.setattr(Feed, "_read_csv_chunks", counting_read_csv_chunks)
+
+        outpath = ptg.extract_feed(
+            inpath, os.path.join(tmpdir, "out.zip"), {"trips.txt": {"trip_id": "t1"}}
+        )
+
+        assert sorted(reads) == sorted(set(reads))
+        with zipfile.ZipFile(outpath) as zf:
+            assert sorted(zf.namelist()) == sorted(files)
+            # The header and the rows of trip t1
+            for name, size in [
+                ("trips.txt", 2),
+                ("stop_times.txt", 3),
+                ("stops.txt", 3),
+            ]:
+                lines = files[name].splitlines()[:size]
+                assert zf.read(name).decode().splitlines() == lines
+
+
+def test_extract_feed_copies_original_lines():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        files = {
+            "agency.txt": (
+                b'\xef\xbb\xbf"agency_name","agency_url","agency_timezone"\r\n'
+                b'"Metro" , http://example.com ,"America/Los_Angeles"\r\n'
+            ),
+            "routes.txt": (
+                b"route_id,route_short_name,route_long_name,route_type\r\n"
+                b'r1,1,"Main, Elm",3\r\n'
+                b"\r\n"
+                b'r2,2,"Oak ""Express""",3\r\n'
+            ),
+            "trips.txt": b"route_id,service_id,trip_id\nr1,s1,t1\nr2,s1,t2\n",
+            "stop_times.txt": (
+                b"trip_id,arrival_time,departure_time,stop_id,stop_sequence\n"
+                b"t1,07:00:00,07:00:00,s1,1\n"
+                b"t2,07:00:00,07:00:00,s2,1\n"
+            ),
+            # Quoted values spanning lines can't be copied line by line
+            "stops.txt": (
+                b"stop_id,stop_name,stop_desc,stop_lat,stop_lon\n"
+                b's1,First,"Two\nlines",37.7700,-122.40\n'
+                b"s2,Second,,37.1,-122.0\n"
+            ),
+        }
+        inpath = os.path.join(tmpdir, "in")
+        os.mkdir(inpath)
+        for name, data in files.items():
+            with open(os.path.join(inpath, name), "wb") as f:
+                f.write(data)
+
+        view = {"trips.txt": {"trip_id": "t1"}}
+        outpath = ptg.extract_feed(inpath, os.path.join(tmpdir, "out.zip"), view)
+
+        with zipfile.ZipFile(outpath) as zf:
+            assert zf.read("agency.txt") == files["agency.txt"]
+            assert zf.read("routes.txt").splitlines() == [
+                b"route_id,route_short_name,route_long_name,route_type",
+                b'r1,1,"Main, Elm",3',
+            ]
+            assert zf.read("trips.txt") == b"route_id,service_id,trip_id\nr1,s1,t1\n"
+            assert zf.read("stop_times.txt").splitlines() == (
+                files["stop_times.txt"].splitlines()[:2]
+            )
+
+        expected = ptg.load_feed(inpath, view)
+        actual = ptg.load_feed(outpath)
+        assert actual.stops.equals(expected.stops)
+        assert list(actual.stops.stop_desc) == ["Two\nlines"]
+
+
+def test_extract_feed_spatial_view():
+    path = fixture("seattle-area-2017-11-16")
+    view = {"stops.txt": {"geometry": BoundingBox(-122.35, 47.6, -122.3, 47.65)}}
+    expected = ptg.load_feed(path, view)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        outfile = ptg.extract_feed(path, os.path.join(tmpdir, "test.zip"), view)
+        feed = ptg.load_feed(outfile)
+
+        for filename in ["stops.txt", "stop_times.txt", "trips.txt", "shapes.txt"]:
+            assert len(feed.get(filename)) == len(expected.get(filename))
+        assert list(feed.stops.stop_id) == list(expected.stops.stop_id)